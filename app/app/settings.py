@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "drf_spectacular",
@@ -51,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.QueryInspectorMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -147,24 +150,104 @@ AUTH_USER_MODEL = "user.User"
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
-    # Configure pagination
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    # Configure pagination (limit/offset with opt-in keyset cursors)
+    "DEFAULT_PAGINATION_CLASS": "core.pagination.KeysetPagination",
     "PAGE_SIZE": 100,
 }
 
 
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
+
+CELERY_BROKER_URL = f"{REDIS_URL}/0"
+CELERY_RESULT_BACKEND = f"{REDIS_URL}/0"
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_BEAT_SCHEDULE = {
     'delete-unpaid-orders-every-hour': {
-        'task': 'orders.tasks.delete_unpaid_orders',
+        'task': 'order.tasks.delete_unpaid_orders',
         'schedule': crontab(minute=0, hour='*/1'),
     },
+    'process-payment-events-every-minute': {
+        'task': 'order.tasks.process_payment_events',
+        'schedule': crontab(),
+    },
+    'delete-expired-tokens-every-hour': {
+        'task': 'user.tasks.delete_expired_tokens',
+        'schedule': crontab(minute=30),
+    },
+    'flush-idle-carts-every-5-minutes': {
+        'task': 'user.tasks.flush_idle_carts',
+        'schedule': crontab(minute='*/5'),
+    },
+}
+
+
+# Shared cache
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"{REDIS_URL}/1",
+    }
 }
 
+# Lifetime of cached catalog responses in seconds. Writes invalidate them
+# explicitly, the timeout bounds staleness of discounts starting or ending
+CATALOG_CACHE_TIMEOUT = 300
+
+# Serialize product lists from plain rows instead of model instances.
+# Output is the same as of `ProductSerializer`, see `product.tests`
+CATALOG_FAST_SERIALIZER = os.environ.get("CATALOG_FAST_SERIALIZER", "1") == "1"
+
+
+# Token authentication cache: seconds in the shared cache and in process
+# memory, where invalidation can't reach other processes, and its size
+AUTH_TOKEN_CACHE_TIMEOUT = 300
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = 5
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 10000
+# Seconds before an auth token expires, tokens never expire when not set
+AUTH_TOKEN_TTL = (
+    int(os.environ["AUTH_TOKEN_TTL"]) if os.environ.get("AUTH_TOKEN_TTL") else None
+)
+
+# Cart storage: `database` writes every change to the cart tables,
+# `redis` keeps active carts in Redis and writes them behind
+CART_STORE = os.environ.get("CART_STORE", "database")
+CART_REDIS_URL = f"{REDIS_URL}/2"
+# Seconds without changes after which a Redis cart is written behind
+CART_IDLE_FLUSH_TIMEOUT = 600
+# Seconds without access after which a Redis cart is dropped and loaded
+# from the database again, far above the flush timeout so that changes
+# are written behind long before
+CART_TTL = 86400
+
+
+# YooKassa client: seconds for a call with all its retries, seconds
+# to connect, retries of failed calls and pooled connections per host
+YOOKASSA_DEADLINE = 10
+YOOKASSA_CONNECT_TIMEOUT = 3
+YOOKASSA_MAX_RETRIES = 2
+YOOKASSA_POOL_SIZE = 10
+# Pooled connections of the async client, one ASGI worker runs many calls
+YOOKASSA_ASYNC_POOL_SIZE = 100
+
+
+# Query inspector: record queries of every request with their call sites
+# and log N+1 queries, the same query repeated `QUERY_INSPECTOR_THRESHOLD`
+# times from one place. `QUERY_INSPECTOR_RAISE` raises instead, for tests.
+# Walking the stack of every query is slow, so it is off unless enabled
+QUERY_INSPECTOR_ENABLED = os.environ.get("QUERY_INSPECTOR_ENABLED", "0") == "1"
+QUERY_INSPECTOR_THRESHOLD = 3
+QUERY_INSPECTOR_RAISE = os.environ.get("QUERY_INSPECTOR_RAISE", "0") == "1"
+
+
+# Prometheus metrics. Processes of each service write them to files in
+# `PROMETHEUS_MULTIPROC_DIR`, `/metrics` merges all files under `METRICS_DIR`
+METRICS_DIR = os.environ.get("METRICS_DIR", os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+# Bearer token of scrapes, metrics are exposed in debug mode only without it
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
 
 # Environment variables
 YOOKASSA_ACCOUNT_ID = os.environ.get("YOOKASSA_ACCOUNT_ID")
 YOOKASSA_SECRET_KEY = os.environ.get("YOOKASSA_SECRET_KEY")
+YOOKASSA_API_URL = os.environ.get("YOOKASSA_API_URL", "https://api.yookassa.ru/v3")
@@ -3,14 +3,19 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from core.views import metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics, name="metrics"),
     path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="api-schema")),
     path("api/user/", include("user.urls")),
     path("api/", include("product.urls")),
     path("api/", include("order.urls")),
+    # Async counterparts of hot endpoints, run them under an ASGI server
+    path("api/async/", include("product.async_urls")),
+    path("api/async/", include("order.async_urls")),
 ]
 
 # Add url to serve media files when debug mode
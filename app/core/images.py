@@ -0,0 +1,80 @@
+import os
+from io import BytesIO
+from PIL import Image, ImageOps
+from django.core.files.base import ContentFile
+
+# Longest side in pixels of every image variant
+IMAGE_VARIANTS = {"thumbnail": 160, "card": 480, "full": 1280}
+# Pillow format and encoding options per variant file extension
+IMAGE_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def has_stale_variants(instance, field_name):
+    """Check if the image variants don't match the current image"""
+    image = getattr(instance, field_name)
+    variants = getattr(instance, f"{field_name}_variants")
+    return variants.get("source") != (image.name or None)
+
+
+def generate_image_variants(image):
+    """
+    Save resized WebP and JPEG variants of the image next to it
+    and return their metadata, e.g.
+    `{"source": ..., "thumbnail": {"width": 160, "height": 90, "webp": ...}}`
+    """
+    with image.storage.open(image.name) as file:
+        with Image.open(file) as original:
+            # Apply camera orientation before resizing
+            picture = ImageOps.exif_transpose(original)
+            picture.load()
+
+    if picture.mode not in ("RGB", "RGBA"):
+        picture = picture.convert("RGBA" if "A" in picture.getbands() else "RGB")
+
+    stem = os.path.splitext(image.name)[0]
+    variants = {"source": image.name}
+    for variant, size in IMAGE_VARIANTS.items():
+        resized = picture.copy()
+        # Downscale only, keeping the aspect ratio
+        resized.thumbnail((size, size), Image.LANCZOS)
+        variants[variant] = {"width": resized.width, "height": resized.height}
+
+        for extension, (image_format, options) in IMAGE_FORMATS.items():
+            encoded = resized.convert("RGB") if image_format == "JPEG" else resized
+            buffer = BytesIO()
+            encoded.save(buffer, image_format, **options)
+            variants[variant][extension] = image.storage.save(
+                f"{stem}_{variant}.{extension}", ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def delete_image_variants(variants, storage):
+    """Delete the variant files listed in the metadata"""
+    for variant in IMAGE_VARIANTS:
+        for extension in IMAGE_FORMATS:
+            name = variants.get(variant, {}).get(extension)
+            if name:
+                storage.delete(name)
+
+
+def get_image_variant_urls(variants, storage, request=None):
+    """
+    Get srcset-style URLs of the image variants from their metadata,
+    without touching the storage files
+    """
+    urls = {}
+    for variant in IMAGE_VARIANTS:
+        if variant not in variants:
+            continue
+
+        urls[variant] = dict(variants[variant])
+        for extension in IMAGE_FORMATS:
+            url = storage.url(variants[variant][extension])
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[variant][extension] = url
+    return urls
@@ -0,0 +1,22 @@
+import zlib
+from contextlib import contextmanager
+from django.db import connection
+
+
+@contextmanager
+def advisory_lock(name):
+    """
+    Hold a Postgres session-level advisory lock named `name` without
+    waiting for it. Yields whether the lock is acquired, so only one
+    process across all nodes runs the guarded code at a time.
+    """
+    key = zlib.crc32(name.encode())
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+        is_acquired = cursor.fetchone()[0]
+    try:
+        yield is_acquired
+    finally:
+        if is_acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
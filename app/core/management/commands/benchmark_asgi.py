@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import statistics
+import time
+import uuid
+import httpx
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+from order.models import Order
+from product.models import Product
+
+# Endpoints by name: method and path under the API root. The same
+# paths are served synchronously under `api/` and async under `api/async/`
+ENDPOINTS = {
+    "products": ("GET", "products/?limit=20"),
+    "product": ("GET", "products/{product}/"),
+    "categories": ("GET", "categories/"),
+    "reviews": ("GET", "products/{product}/reviews/"),
+    "payment": ("POST", "orders/{order}/create-payment/"),
+}
+
+
+class Command(BaseCommand):
+    """
+    Django command to compare throughput of the WSGI and ASGI request paths.
+    Sends the same concurrent requests to the synchronous endpoints of the
+    WSGI server and to their async counterparts of the ASGI server, e.g.
+    `runserver` and `uvicorn app.asgi:application`. Point both servers
+    at a slow gateway, e.g. `fake_yookassa --latency 300`, to see how
+    they wait for payment creation.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi-url", default="http://localhost:8000")
+        parser.add_argument("--asgi-url", default="http://localhost:8002")
+        parser.add_argument(
+            "--endpoints",
+            nargs="+",
+            choices=ENDPOINTS,
+            default=list(ENDPOINTS),
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=500,
+            help="Requests per endpoint and server.",
+        )
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Make every request URL unique to miss the catalog cache.",
+        )
+
+    def handle(self, *args, **options):
+        product = Product.objects.order_by("pk").first()
+        if product is None:
+            raise CommandError("No products to request, seed the catalog first.")
+
+        user = None
+        headers = {}
+        orders = []
+        if "payment" in options["endpoints"]:
+            # Every concurrent client pays for its own order
+            user = get_user_model().objects.create_user(
+                email=f"benchmark-asgi-{uuid.uuid4().hex[:8]}@example.com",
+                password=uuid.uuid4().hex,
+            )
+            token = Token.objects.create(user=user)
+            headers["Authorization"] = f"Token {token.key}"
+            orders = Order.objects.bulk_create(
+                Order(user=user, total=100) for _ in range(options["concurrency"])
+            )
+
+        try:
+            for endpoint in options["endpoints"]:
+                method, path = ENDPOINTS[endpoint]
+                throughputs = []
+                for server, base_url in (
+                    ("wsgi", f"{options['wsgi_url']}/api/"),
+                    ("asgi", f"{options['asgi_url']}/api/async/"),
+                ):
+                    latencies, errors, elapsed = asyncio.run(
+                        self.run_load(
+                            method, base_url + path, product, orders, headers, options
+                        )
+                    )
+                    throughputs.append(len(latencies) / elapsed)
+                    self.write_result(endpoint, server, latencies, errors, elapsed)
+                self.stdout.write(
+                    f"{endpoint}: ASGI/WSGI throughput "
+                    f"x{throughputs[1] / throughputs[0]:.2f}"
+                )
+        finally:
+            if user is not None:
+                user.delete()
+
+    async def run_load(self, method, url, product, orders, headers, options):
+        """Send requests from concurrent clients, return latencies and errors"""
+        numbers = itertools.count()
+        latencies = []
+        errors = 0
+        run_id = uuid.uuid4().hex[:8]
+        payload = {"return_url": "https://example.com/"} if method == "POST" else None
+
+        async def client_loop(client, slot):
+            nonlocal errors
+            while (number := next(numbers)) < options["requests"]:
+                request_url = url.format(
+                    product=product.pk, order=orders[slot].pk if orders else None
+                )
+                if options["cold"]:
+                    # Unknown query parameters are ignored by the views
+                    separator = "&" if "?" in request_url else "?"
+                    request_url += f"{separator}nocache={run_id}-{number}"
+
+                started_at = time.perf_counter()
+                try:
+                    response = await client.request(
+                        method, request_url, headers=headers, json=payload
+                    )
+                    errors += response.is_error
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started_at)
+
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            started_at = time.perf_counter()
+            await asyncio.gather(
+                *(client_loop(client, slot) for slot in range(options["concurrency"]))
+            )
+            elapsed = time.perf_counter() - started_at
+        return latencies, errors, elapsed
+
+    def write_result(self, endpoint, server, latencies, errors, elapsed):
+        percentiles = [0] * 99
+        if len(latencies) > 1:
+            percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{endpoint:<11}{server:<5}{len(latencies) / elapsed:>9.1f} req/s  "
+            f"p50 {percentiles[49] * 1000:>7.1f} ms  "
+            f"p95 {percentiles[94] * 1000:>7.1f} ms  "
+            f"p99 {percentiles[98] * 1000:>7.1f} ms  "
+            f"{errors} errors"
+        )
@@ -0,0 +1,436 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+import httpx
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from order.models import Order, OrderItem, PaymentEvent
+from order.services import delete_orders
+from product.cache import invalidate_catalog
+from product.models import Product
+
+# Funnel steps in the order they run
+STEPS = (
+    "browse",
+    "search",
+    "filter",
+    "product",
+    "reviews",
+    "register",
+    "token",
+    "address",
+    "cart_add",
+    "cart_update",
+    "order",
+    "payment",
+    "webhook",
+)
+CATALOG_STEPS = STEPS[:5]
+# Notifications are accepted from YooKassa addresses only
+WEBHOOK_HEADERS = {"X-Forwarded-For": "185.71.76.1"}
+ORDERINGS = ("", "&ordering=price", "&ordering=-final_price", "&ordering=-rating")
+
+
+class Shopper:
+    """Virtual user going through the funnel, keeps results of its steps"""
+
+    def __init__(self, run_id, number, product_id):
+        self.email = f"benchmark-funnel-{run_id}-{number}@example.com"
+        self.password = uuid.uuid4().hex
+        self.product_id = product_id
+        self.headers = None
+        self.cart_item_id = None
+        self.order_id = None
+
+
+class Command(BaseCommand):
+    """
+    Django command to load the shopping funnel of a running server
+    step by step: catalog browse, search and filter, product detail with
+    reviews, registration and token, cart, order, payment creation and
+    a burst of YooKassa notifications. Reports latency percentiles and
+    throughput per step, saves them as JSON and fails when a step
+    regresses against a saved baseline.
+
+    Run the server against the local Postgres and Redis with
+    `YOOKASSA_API_URL` pointing at `fake_yookassa`, and seed the same
+    dataset before runs to compare them, e.g. `seed_dataset --clear`.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://localhost:8000")
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=100,
+            help="Shoppers going through the checkout steps, one request each.",
+        )
+        parser.add_argument(
+            "--catalog-requests",
+            type=int,
+            default=500,
+            help="Requests per catalog step.",
+        )
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of request parameters, the same seed sends the same URLs.",
+        )
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Make every catalog URL unique to miss the catalog cache.",
+        )
+        parser.add_argument("--output", help="Save results to a JSON file.")
+        parser.add_argument(
+            "--baseline",
+            help="Compare results with a JSON file saved by an earlier run.",
+        )
+        parser.add_argument(
+            "--max-latency-regression",
+            type=float,
+            default=20,
+            help="Allowed growth of p95 latency of a step in percent.",
+        )
+        parser.add_argument(
+            "--max-throughput-regression",
+            type=float,
+            default=20,
+            help="Allowed drop of throughput of a step in percent.",
+        )
+        parser.add_argument(
+            "--max-error-rate",
+            type=float,
+            default=1,
+            help="Allowed failed requests of a step in percent.",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+
+        products = list(
+            Product.objects.filter(qty_in_stock__gte=10)
+            .order_by("pk")
+            .values("pk", "name", "brand", "category_id", "price")
+        )
+        if not products:
+            raise CommandError("No products in stock, seed the catalog first.")
+
+        run_id = uuid.uuid4().hex[:8]
+        started_at = timezone.now()
+        try:
+            steps = asyncio.run(self.run_funnel(products, run_id, options))
+        finally:
+            self.clean_up(run_id)
+
+        results = {
+            "started_at": started_at.isoformat(),
+            "url": options["url"],
+            "options": {
+                name: options[name]
+                for name in ("users", "catalog_requests", "concurrency", "seed", "cold")
+            },
+            "products": len(products),
+            "steps": steps,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Results are saved to {options['output']}.")
+
+        failures = self.check_errors(steps, options)
+        if baseline is not None:
+            failures += self.compare(steps, baseline["steps"], options)
+        if failures:
+            raise CommandError("Regressions found:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("No regressions found."))
+
+    async def run_funnel(self, products, run_id, options):
+        """Run the funnel steps one after another, return results by step"""
+        rng = random.Random(options["seed"])
+        catalog_urls = self.get_catalog_urls(products, rng, run_id, options)
+        shoppers = [
+            Shopper(run_id, number, rng.choice(products)["pk"])
+            for number in range(options["users"])
+        ]
+
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        async with httpx.AsyncClient(
+            base_url=f"{options['url']}/api/", limits=limits, timeout=60
+        ) as client:
+            steps = {}
+            for step in STEPS:
+                if step in CATALOG_STEPS:
+                    calls = [
+                        lambda client, url=url: client.get(url)
+                        for url in catalog_urls[step]
+                    ]
+                elif step == "webhook":
+                    calls = self.get_webhook_calls(shoppers, run_id)
+                else:
+                    handler = getattr(self, f"step_{step}")
+                    calls = [
+                        lambda client, shopper=shopper, handler=handler: handler(
+                            client, shopper
+                        )
+                        for shopper in shoppers
+                        if self.is_ready(step, shopper)
+                    ]
+                steps[step] = await self.run_step(client, calls, options)
+                self.write_result(step, steps[step])
+        return steps
+
+    def get_catalog_urls(self, products, rng, run_id, options):
+        """Get URLs of the catalog steps picked by the seeded generator"""
+        count = options["catalog_requests"]
+        words = sorted({word for p in products for word in p["name"].split()})
+        brands = sorted({p["brand"] for p in products if p["brand"]})
+        categories = sorted({p["category_id"] for p in products})
+        pages = max(len(products) // 20, 1)
+
+        urls = {
+            "browse": [
+                f"products/?limit=20&offset={rng.randrange(pages) * 20}"
+                f"{rng.choice(ORDERINGS)}"
+                for _ in range(count)
+            ],
+            "search": [
+                f"products/?limit=20&search={rng.choice(words)}" for _ in range(count)
+            ],
+            "filter": [],
+            "product": [
+                f"products/{rng.choice(products)['pk']}/" for _ in range(count)
+            ],
+            "reviews": [
+                f"products/{rng.choice(products)['pk']}/reviews/" for _ in range(count)
+            ],
+        }
+        for _ in range(count):
+            url = f"products/?limit=20&category={rng.choice(categories)}"
+            if brands and rng.random() < 0.5:
+                url += f"&brand={rng.choice(brands)}"
+            price = float(rng.choice(products)["price"])
+            url += f"&price__gte={price * 0.5:.0f}&price__lte={price * 1.5:.0f}"
+            urls["filter"].append(url)
+
+        if options["cold"]:
+            # Unknown query parameters are ignored by the views
+            for step_urls in urls.values():
+                step_urls[:] = [
+                    f"{url}{'&' if '?' in url else '?'}nocache={run_id}-{number}"
+                    for number, url in enumerate(step_urls)
+                ]
+        return urls
+
+    @staticmethod
+    def is_ready(step, shopper):
+        """Check the shopper passed the steps the given one depends on"""
+        if step in ("register", "token"):
+            return True
+        if step == "cart_update":
+            return shopper.cart_item_id is not None
+        if step == "payment":
+            return shopper.order_id is not None
+        return shopper.headers is not None
+
+    async def step_register(self, client, shopper):
+        return await client.post(
+            "user/register/",
+            json={"email": shopper.email, "password": shopper.password},
+        )
+
+    async def step_token(self, client, shopper):
+        response = await client.post(
+            "user/token/",
+            json={"email": shopper.email, "password": shopper.password},
+        )
+        if response.status_code == 200:
+            shopper.headers = {"Authorization": f"Token {response.json()['token']}"}
+        return response
+
+    async def step_address(self, client, shopper):
+        return await client.post(
+            "user/me/shipping-address/",
+            headers=shopper.headers,
+            json={
+                "country": "Russia",
+                "city": "Moscow",
+                "street": "Tverskaya",
+                "house": "1",
+                "postal_code": "125009",
+            },
+        )
+
+    async def step_cart_add(self, client, shopper):
+        response = await client.post(
+            "user/cart-items/",
+            headers=shopper.headers,
+            json={"product": shopper.product_id, "quantity": 1},
+        )
+        if response.status_code == 201:
+            shopper.cart_item_id = response.json()["id"]
+        return response
+
+    async def step_cart_update(self, client, shopper):
+        return await client.patch(
+            f"user/cart-items/{shopper.cart_item_id}/",
+            headers=shopper.headers,
+            json={"quantity": 2},
+        )
+
+    async def step_order(self, client, shopper):
+        response = await client.post("orders/", headers=shopper.headers, json={})
+        if response.status_code == 201:
+            shopper.order_id = response.json()["id"]
+        return response
+
+    async def step_payment(self, client, shopper):
+        return await client.post(
+            f"orders/{shopper.order_id}/create-payment/",
+            headers=shopper.headers,
+            json={"return_url": "https://example.com/"},
+        )
+
+    def get_webhook_calls(self, shoppers, run_id):
+        """Get notifications of paid orders, every one is delivered twice"""
+        calls = []
+        for shopper in shoppers:
+            if shopper.order_id is None:
+                continue
+            notification = {
+                "type": "notification",
+                "event": "payment.succeeded",
+                "object": {
+                    "id": f"benchmark-{run_id}-{uuid.uuid4()}",
+                    "status": "succeeded",
+                    "paid": True,
+                    "payment_method": {"type": "bank_card"},
+                    "metadata": {"order_id": shopper.order_id},
+                },
+            }
+
+            def call(client, notification=notification):
+                return client.post(
+                    "yookassa-webhooks/", headers=WEBHOOK_HEADERS, json=notification
+                )
+
+            calls += [call, call]
+        return calls
+
+    async def run_step(self, client, calls, options):
+        """Make the calls from concurrent clients, return the step result"""
+        pending = iter(calls)
+        latencies = []
+        errors = 0
+
+        async def client_loop():
+            nonlocal errors
+            for call in pending:
+                started_at = time.perf_counter()
+                try:
+                    response = await call(client)
+                    errors += response.is_error
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(options["concurrency"])))
+        elapsed = time.perf_counter() - started_at
+
+        percentiles = [0] * 99
+        if len(latencies) > 1:
+            percentiles = statistics.quantiles(latencies, n=100)
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "throughput": round(len(latencies) / elapsed, 2) if latencies else 0,
+            "p50": round(percentiles[49] * 1000, 2),
+            "p95": round(percentiles[94] * 1000, 2),
+            "p99": round(percentiles[98] * 1000, 2),
+        }
+
+    def write_result(self, step, result):
+        self.stdout.write(
+            f"{step:<12}{result['requests']:>6} requests"
+            f"{result['throughput']:>9.1f} req/s  "
+            f"p50 {result['p50']:>7.1f} ms  "
+            f"p95 {result['p95']:>7.1f} ms  "
+            f"p99 {result['p99']:>7.1f} ms  "
+            f"{result['errors']} errors"
+        )
+
+    def check_errors(self, steps, options):
+        failures = []
+        for step, result in steps.items():
+            if not result["requests"]:
+                failures.append(f"{step}: no requests, earlier steps failed")
+                continue
+            error_rate = result["errors"] / result["requests"] * 100
+            if error_rate > options["max_error_rate"]:
+                failures.append(f"{step}: {error_rate:.1f}% of requests failed")
+        return failures
+
+    def compare(self, steps, baseline_steps, options):
+        """Compare steps with the baseline, return descriptions of regressions"""
+        failures = []
+        self.stdout.write("Changes against the baseline:")
+        for step, result in steps.items():
+            baseline = baseline_steps.get(step)
+            if not baseline or not baseline["p95"] or not baseline["throughput"]:
+                continue
+            latency_change = (result["p95"] / baseline["p95"] - 1) * 100
+            throughput_change = (
+                result["throughput"] / baseline["throughput"] - 1
+            ) * 100
+            self.stdout.write(
+                f"{step:<12}p95 {latency_change:>+7.1f}%  "
+                f"throughput {throughput_change:>+7.1f}%"
+            )
+            if latency_change > options["max_latency_regression"]:
+                failures.append(
+                    f"{step}: p95 {baseline['p95']} -> {result['p95']} ms "
+                    f"({latency_change:+.1f}%)"
+                )
+            if -throughput_change > options["max_throughput_regression"]:
+                failures.append(
+                    f"{step}: throughput {baseline['throughput']} -> "
+                    f"{result['throughput']} req/s ({throughput_change:+.1f}%)"
+                )
+        return failures
+
+    @transaction.atomic
+    def clean_up(self, run_id):
+        """Delete shoppers of the run with their orders, return the stock"""
+        users = get_user_model().objects.filter(
+            email__startswith=f"benchmark-funnel-{run_id}-"
+        )
+        order_ids = list(
+            Order.objects.filter(user__in=users).values_list("id", flat=True)
+        )
+        quantities = dict(
+            OrderItem.objects.filter(order_id__in=order_ids)
+            .order_by()
+            .values_list("product_id")
+            .annotate(quantity=Sum("quantity"))
+        )
+        # Return the stock of paid orders too, so runs start from the same stock
+        Product.objects.return_stock_bulk(quantities)
+        delete_orders(order_ids)
+        users.delete()
+        events = PaymentEvent.objects.filter(event_id__contains=f"benchmark-{run_id}-")
+        events.delete()
+
+        for product_id in quantities:
+            invalidate_catalog("products", product_id)
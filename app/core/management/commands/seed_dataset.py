@@ -0,0 +1,733 @@
+import io
+import json
+import random
+import time
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Round
+from django.utils import timezone
+from order.models import Order, OrderItem, Payment, PaymentEvent
+from product.cache import CACHE_RESOURCES, invalidate_catalog
+from product.models import (
+    Category,
+    Product,
+    ProductDiscount,
+    ProductImage,
+    Review,
+    final_price_expression,
+)
+from user.models import Cart, CartItem, Profile, ShippingAddress, WishItem
+
+# Numbers of generated rows by preset, other rows are generated per user
+PRESETS = {
+    "small": {
+        "categories": 100,
+        "discounts": 50,
+        "products": 20_000,
+        "users": 2_000,
+        "reviews": 20_000,
+        "orders": 10_000,
+    },
+    "medium": {
+        "categories": 1_000,
+        "discounts": 500,
+        "products": 500_000,
+        "users": 50_000,
+        "reviews": 500_000,
+        "orders": 250_000,
+    },
+    "large": {
+        "categories": 5_000,
+        "discounts": 2_000,
+        "products": 3_000_000,
+        "users": 500_000,
+        "reviews": 5_000_000,
+        "orders": 2_000_000,
+    },
+}
+# Shares of users with a profile, an address, cart items and a wishlist
+PROFILE_SHARE = 0.7
+ADDRESS_SHARE = 0.8
+CART_SHARE = 0.3
+WISHLIST_SHARE = 0.4
+
+CATEGORY_NAMES = (
+    "Phones Laptops Tablets Headphones Cameras Watches Monitors Keyboards "
+    "Speakers Printers Routers Drives Shoes Jackets Bags Chairs Tables "
+    "Lamps Kettles Blenders Bicycles Tents Books Toys Games"
+).split()
+BRANDS = (
+    "Acme Zeta Nord Volta Orbit Pixel Lumen Atlas Vertex Nova Polar Echo "
+    "Summit Quanta Helix Terra Aurora Cobalt Falcon Granit Ирбис Сокол "
+    "Восток"
+).split()
+ADJECTIVES = (
+    "Pro Max Lite Ultra Mini Plus Air Neo Prime Smart Classic Sport Compact "
+    "Turbo Edge"
+).split()
+DESCRIPTION_WORDS = (
+    "durable lightweight wireless waterproof fast quiet ergonomic premium "
+    "compact reliable battery display camera storage design warranty steel "
+    "aluminium cotton leather удобный надежный легкий быстрый"
+).split()
+# Property values by key, every category uses its own subset of keys
+PROPERTY_VALUES = {
+    "color": ["black", "white", "red", "blue", "green", "silver", "gold"],
+    "ram": [2, 4, 6, 8, 12, 16, 32, 64],
+    "storage": [32, 64, 128, 256, 512, 1024, 2048],
+    "size": ["XS", "S", "M", "L", "XL", "XXL"],
+    "material": ["plastic", "metal", "wood", "glass", "cotton", "leather"],
+    "weight": [0.1, 0.25, 0.5, 1, 1.5, 2, 5, 10],
+    "wireless": [True, False],
+    "waterproof": [True, False],
+    "warranty": [6, 12, 24, 36],
+    "power": [5, 10, 20, 65, 100, 1000, 2000],
+    "country": ["China", "Russia", "Germany", "Japan", "Korea", "USA"],
+    "screen": [5.5, 6.1, 6.7, 10.9, 13.3, 15.6, 27],
+}
+CITIES = ["Moscow", "Saint Petersburg", "Kazan", "Novosibirsk", "Omsk"]
+FIRST_NAMES = ["Ivan", "Anna", "Petr", "Maria", "Alexei", "Olga", "Dmitry", "Elena"]
+LAST_NAMES = ["Ivanov", "Smirnova", "Petrov", "Sokolova", "Kuznetsov", "Popova"]
+PAYMENT_METHODS = ["bank_card", "sbp", "yoo_money", "sberbank"]
+
+
+def copy_value(value):
+    """Format a value for the text format of `COPY`"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, str):
+        return (
+            value.replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+    return str(value)
+
+
+class Command(BaseCommand):
+    """
+    Django command to generate a large synthetic dataset for benchmarks:
+    categories, discounts, products with varied properties, users with
+    profiles, addresses, carts, wishlists and reviews, and years of
+    orders with payments. Rows are generated from the seed, the same
+    seed and counts give the same data relative to the current date.
+
+    Rows are loaded with `COPY`, so no model signals are sent.
+    Derived fields, product review aggregates, order totals and
+    payment amounts, are filled afterwards in set-based updates.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--preset", choices=PRESETS, default="small")
+        for name in PRESETS["small"]:
+            parser.add_argument(
+                f"--{name}", type=int, help=f"Override {name} of the preset."
+            )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--years", type=int, default=3, help="Years of order history."
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50_000,
+            help="Rows sent with one `COPY`.",
+        )
+        parser.add_argument(
+            "--password",
+            default="password",
+            help="Password of every generated user.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Empty catalog, user and order tables first, staff users too.",
+        )
+
+    def handle(self, *args, **options):
+        self.seed = options["seed"]
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now().replace(microsecond=0)
+        self.started = self.now - timedelta(days=365 * options["years"])
+        counts = {
+            name: options[name] if options[name] is not None else count
+            for name, count in PRESETS[options["preset"]].items()
+        }
+
+        started_at = time.monotonic()
+        if options["clear"]:
+            self.clear()
+        with transaction.atomic():
+            self.create_catalog(counts)
+            self.create_users(counts, options["password"])
+            self.create_reviews(counts)
+            self.create_orders(counts)
+            self.fix_up()
+            for resource in CACHE_RESOURCES:
+                invalidate_catalog(resource)
+        self.analyze()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Dataset is seeded in {time.monotonic() - started_at:.0f}s."
+            )
+        )
+
+    def get_random(self, name):
+        """Get a generator of the table, so tables don't depend on each other"""
+        return random.Random(f"{self.seed}:{name}")
+
+    def get_time(self, position, count):
+        """Get a time growing with the row position over the whole period"""
+        return self.started + (self.now - self.started) * (position + 1) / (count + 1)
+
+    def reserve_ids(self, model, count):
+        """Take `count` ids from the table sequence, return the first one"""
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'))", [table])
+            first_id = cursor.fetchone()[0]
+            if count > 1:
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)",
+                    [table, first_id + count - 1],
+                )
+        return first_id
+
+    def copy_rows(self, model, fields, rows):
+        """Load rows of field values into the model's table in batches"""
+        quote_name = connection.ops.quote_name
+        columns = ", ".join(
+            quote_name(model._meta.get_field(field).column) for field in fields
+        )
+        sql = f"COPY {quote_name(model._meta.db_table)} ({columns}) FROM STDIN"
+
+        started_at = time.monotonic()
+        count = 0
+        buffer = io.StringIO()
+        with connection.cursor() as cursor:
+            for row in rows:
+                buffer.write("\t".join(map(copy_value, row)))
+                buffer.write("\n")
+                count += 1
+                if count % self.batch_size == 0:
+                    buffer.seek(0)
+                    cursor.copy_expert(sql, buffer)
+                    buffer = io.StringIO()
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+
+        elapsed = time.monotonic() - started_at
+        self.stdout.write(
+            f"{model._meta.label}: {count} rows in {elapsed:.1f}s "
+            f"({count / max(elapsed, 0.001):.0f} rows/s)"
+        )
+        return count
+
+    def clear(self):
+        models = [
+            PaymentEvent,
+            Payment,
+            OrderItem,
+            Order,
+            Review,
+            WishItem,
+            CartItem,
+            Cart,
+            ShippingAddress,
+            Profile,
+            ProductImage,
+            Product,
+            ProductDiscount,
+            Category,
+            get_user_model(),
+        ]
+        tables = ", ".join(
+            connection.ops.quote_name(model._meta.db_table) for model in models
+        )
+        with connection.cursor() as cursor:
+            # Tokens and other rows referring to users are emptied too,
+            # restarted sequences give the same ids to the same seed
+            cursor.execute(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+        self.stdout.write("Tables are emptied.")
+
+    def create_catalog(self, counts):
+        rng = self.get_random("categories")
+        self.category_first_id = self.reserve_ids(Category, counts["categories"])
+        # Products of a category share a set of property keys
+        self.category_keys = [
+            rng.sample(sorted(PROPERTY_VALUES), rng.randint(2, 6))
+            for _ in range(counts["categories"])
+        ]
+        self.copy_rows(
+            Category,
+            ["id", "name", "created_at", "updated_at"],
+            (
+                (
+                    self.category_first_id + i,
+                    f"{rng.choice(CATEGORY_NAMES)} {self.seed}-{i + 1}",
+                    self.started,
+                    self.started,
+                )
+                for i in range(counts["categories"])
+            ),
+        )
+
+        rng = self.get_random("discounts")
+        self.discount_first_id = self.reserve_ids(ProductDiscount, counts["discounts"])
+        today = self.now.date()
+
+        def discount_rows():
+            for i in range(counts["discounts"]):
+                # Most discounts are current, others ended or not started yet
+                start_date = today + timedelta(days=rng.randint(-60, 0))
+                if rng.random() < 0.2:
+                    start_date += timedelta(days=rng.choice([-90, 30]))
+                end_date = start_date + timedelta(days=rng.randint(7, 90))
+                yield (
+                    self.discount_first_id + i,
+                    f"Seed {self.seed} sale {i + 1}",
+                    "",
+                    f"{rng.randint(2, 20) * 2.5:.1f}",
+                    start_date,
+                    end_date,
+                    rng.random() < 0.9,
+                    self.now,
+                    self.now,
+                )
+
+        self.copy_rows(
+            ProductDiscount,
+            [
+                "id",
+                "name",
+                "description",
+                "discount_percent",
+                "start_date",
+                "end_date",
+                "is_active",
+                "created_at",
+                "updated_at",
+            ],
+            discount_rows(),
+        )
+
+        rng = self.get_random("products")
+        self.product_count = counts["products"]
+        self.product_first_id = self.reserve_ids(Product, counts["products"])
+
+        def product_rows():
+            for i in range(counts["products"]):
+                # Few categories and discounts have most of the products
+                category = int(counts["categories"] * rng.random() ** 2)
+                properties = {
+                    key: rng.choice(PROPERTY_VALUES[key])
+                    for key in self.category_keys[category]
+                    if rng.random() < 0.8
+                }
+                discount_id = None
+                if counts["discounts"] and rng.random() < 0.3:
+                    discount_id = self.discount_first_id + int(
+                        counts["discounts"] * rng.random() ** 2
+                    )
+                brand = rng.choice(BRANDS)
+                created_at = self.get_time(i, counts["products"])
+                yield (
+                    self.product_first_id + i,
+                    self.category_first_id + category,
+                    f"SEED{self.seed}-{i + 1:08d}",
+                    f"{brand} {rng.choice(ADJECTIVES)} {rng.randint(1, 999)}",
+                    " ".join(rng.choices(DESCRIPTION_WORDS, k=rng.randint(5, 30))),
+                    brand,
+                    rng.choice([0, rng.randint(1, 20), rng.randint(20, 1000)]),
+                    json.dumps(properties),
+                    0,
+                    0,
+                    0,
+                    0,
+                    0,
+                    0,
+                    0,
+                    0,
+                    f"{min(max(rng.lognormvariate(8, 1.3), 1), 999_999):.2f}",
+                    discount_id,
+                    created_at,
+                    created_at,
+                )
+
+        self.copy_rows(
+            Product,
+            [
+                "id",
+                "category",
+                "sku",
+                "name",
+                "description",
+                "brand",
+                "qty_in_stock",
+                "properties",
+                "rating",
+                "review_count",
+                "rating_sum",
+                "rating_1_count",
+                "rating_2_count",
+                "rating_3_count",
+                "rating_4_count",
+                "rating_5_count",
+                "price",
+                "discount",
+                "created_at",
+                "updated_at",
+            ],
+            product_rows(),
+        )
+
+    def pick_products(self, rng, count):
+        """Pick distinct products, popular ones more often"""
+        count = min(count, self.product_count)
+        product_ids = set()
+        while len(product_ids) < count:
+            product_ids.add(
+                self.product_first_id + int(self.product_count * rng.random() ** 3)
+            )
+        return sorted(product_ids)
+
+    def create_users(self, counts, password):
+        rng = self.get_random("users")
+        self.user_first_id = self.reserve_ids(get_user_model(), counts["users"])
+        # Hash once with a fixed salt, hashing per user would take hours
+        password = make_password(password, salt=f"seed{self.seed}")
+        self.copy_rows(
+            get_user_model(),
+            [
+                "id",
+                "password",
+                "is_superuser",
+                "email",
+                "is_staff",
+                "created_at",
+                "updated_at",
+            ],
+            (
+                (
+                    self.user_first_id + i,
+                    password,
+                    False,
+                    f"seed{self.seed}-user{i + 1}@example.com",
+                    False,
+                    self.get_time(i, counts["users"]),
+                    self.get_time(i, counts["users"]),
+                )
+                for i in range(counts["users"])
+            ),
+        )
+
+        self.copy_rows(
+            Profile,
+            [
+                "user",
+                "first_name",
+                "last_name",
+                "telephone",
+                "profile_photo_variants",
+                "created_at",
+                "updated_at",
+            ],
+            (
+                (
+                    self.user_first_id + i,
+                    rng.choice(FIRST_NAMES),
+                    rng.choice(LAST_NAMES),
+                    f"+7{self.seed % 100:02d}{i + 1:08d}",
+                    "{}",
+                    self.get_time(i, counts["users"]),
+                    self.get_time(i, counts["users"]),
+                )
+                for i in range(counts["users"])
+                if rng.random() < PROFILE_SHARE
+            ),
+        )
+
+        self.users_with_address = set()
+
+        def address_rows():
+            for i in range(counts["users"]):
+                if rng.random() >= ADDRESS_SHARE:
+                    continue
+                self.users_with_address.add(self.user_first_id + i)
+                yield (
+                    self.user_first_id + i,
+                    "Russia",
+                    rng.choice(CITIES),
+                    f"Street {rng.randint(1, 500)}",
+                    str(rng.randint(1, 200)),
+                    str(rng.randint(1, 300)) if rng.random() < 0.7 else "",
+                    f"{rng.randint(100000, 999999)}",
+                    self.get_time(i, counts["users"]),
+                    self.get_time(i, counts["users"]),
+                )
+
+        self.copy_rows(
+            ShippingAddress,
+            [
+                "user",
+                "country",
+                "city",
+                "street",
+                "house",
+                "apartment",
+                "postal_code",
+                "created_at",
+                "updated_at",
+            ],
+            address_rows(),
+        )
+
+        # Every user has a cart, `COPY` skips `create_cart_for_user` creating it
+        self.copy_rows(
+            Cart,
+            ["user", "created_at", "updated_at"],
+            (
+                (self.user_first_id + i, self.now, self.now)
+                for i in range(counts["users"])
+            ),
+        )
+        cart_users = [
+            self.user_first_id + i
+            for i in range(counts["users"])
+            if rng.random() < CART_SHARE
+        ]
+        self.copy_rows(
+            CartItem,
+            ["cart", "product", "quantity", "created_at", "updated_at"],
+            (
+                (user_id, product_id, rng.randint(1, 3), self.now, self.now)
+                for user_id in cart_users
+                for product_id in self.pick_products(rng, rng.randint(1, 5))
+            ),
+        )
+        self.copy_rows(
+            WishItem,
+            ["user", "product", "created_at", "updated_at"],
+            (
+                (self.user_first_id + i, product_id, self.now, self.now)
+                for i in range(counts["users"])
+                if rng.random() < WISHLIST_SHARE
+                for product_id in self.pick_products(rng, rng.randint(1, 10))
+            ),
+        )
+
+    def create_reviews(self, counts):
+        rng = self.get_random("reviews")
+        # Reviews per user vary around the average, a user reviews
+        # a product once
+        average = counts["reviews"] / max(counts["users"], 1)
+
+        def review_rows():
+            for i in range(counts["users"]):
+                user_id = self.user_first_id + i
+                review_count = int(rng.uniform(0, 2 * average) + 0.5)
+                for product_id in self.pick_products(rng, review_count):
+                    created_at = self.started + (self.now - self.started) * rng.random()
+                    rating = rng.choices([1, 2, 3, 4, 5], [5, 5, 10, 30, 50])[0]
+                    yield (
+                        user_id,
+                        product_id,
+                        rating,
+                        " ".join(rng.choices(DESCRIPTION_WORDS, k=rng.randint(0, 20))),
+                        created_at,
+                        created_at,
+                    )
+
+        self.copy_rows(
+            Review,
+            ["user", "product", "rating", "text", "created_at", "updated_at"],
+            review_rows(),
+        )
+
+    def create_orders(self, counts):
+        rng = self.get_random("orders")
+        self.order_count = counts["orders"]
+        self.order_first_id = self.reserve_ids(Order, counts["orders"])
+        # Orders of every user, paid states and times by order position
+        orders = []
+        recent = self.now - timedelta(hours=3)
+        for i in range(counts["orders"]):
+            created_at = self.get_time(i, counts["orders"])
+            # Orders older than a few hours are mostly paid, recent ones are not
+            is_paid = rng.random() < (0.9 if created_at < recent else 0.3)
+            user_id = self.user_first_id + rng.randrange(counts["users"])
+            orders.append((self.order_first_id + i, user_id, is_paid, created_at))
+
+        self.copy_rows(
+            Order,
+            [
+                "id",
+                "user",
+                "shipping_address",
+                "total",
+                "is_paid",
+                "created_at",
+                "updated_at",
+            ],
+            (
+                (
+                    order_id,
+                    user_id,
+                    user_id if user_id in self.users_with_address else None,
+                    0,
+                    is_paid,
+                    created_at,
+                    created_at,
+                )
+                for order_id, user_id, is_paid, created_at in orders
+            ),
+        )
+        self.copy_rows(
+            OrderItem,
+            ["order", "product", "quantity", "created_at", "updated_at"],
+            (
+                (
+                    order_id,
+                    product_id,
+                    rng.choices([1, 2, 3], [80, 15, 5])[0],
+                    created_at,
+                    created_at,
+                )
+                for order_id, _, _, created_at in orders
+                for product_id in self.pick_products(
+                    rng, rng.choices([1, 2, 3, 4, 5], [50, 25, 12, 8, 5])[0]
+                )
+            ),
+        )
+
+        def payment_rows():
+            for order_id, _, is_paid, created_at in orders:
+                if is_paid:
+                    status = Payment.SUCCEEDED
+                elif rng.random() < 0.5:
+                    status = rng.choice([Payment.PENDING, Payment.CANCELED])
+                else:
+                    continue
+                yield (
+                    order_id,
+                    0,
+                    "RUB",
+                    status,
+                    rng.choice(PAYMENT_METHODS) if is_paid else "",
+                    created_at,
+                    created_at + timedelta(seconds=rng.randint(10, 600)),
+                )
+
+        self.copy_rows(
+            Payment,
+            [
+                "order",
+                "amount",
+                "currency",
+                "status",
+                "payment_method",
+                "created_at",
+                "updated_at",
+            ],
+            payment_rows(),
+        )
+
+    def fix_up(self):
+        """Fill derived fields of the generated rows in set-based updates"""
+        quote_name = connection.ops.quote_name
+        product_table = quote_name(Product._meta.db_table)
+        review_table = quote_name(Review._meta.db_table)
+        order_table = quote_name(Order._meta.db_table)
+        payment_table = quote_name(Payment._meta.db_table)
+        last_product_id = self.product_first_id + self.product_count - 1
+        last_order_id = self.order_first_id + self.order_count - 1
+
+        with connection.cursor() as cursor:
+            started_at = time.monotonic()
+            star_counts = ", ".join(
+                f"COUNT(*) FILTER (WHERE rating = {star}) AS rating_{star}_count"
+                for star in range(1, 6)
+            )
+            star_updates = ", ".join(
+                f"rating_{star}_count = reviews.rating_{star}_count"
+                for star in range(1, 6)
+            )
+            cursor.execute(
+                f"""
+                UPDATE {product_table} AS product SET
+                    review_count = reviews.review_count,
+                    rating_sum = reviews.rating_sum,
+                    rating = reviews.rating_sum::float / reviews.review_count,
+                    {star_updates}
+                FROM (
+                    SELECT product_id, COUNT(*) AS review_count,
+                        SUM(rating) AS rating_sum, {star_counts}
+                    FROM {review_table}
+                    WHERE product_id BETWEEN %s AND %s
+                    GROUP BY product_id
+                ) AS reviews
+                WHERE product.id = reviews.product_id
+                """,
+                [self.product_first_id, last_product_id],
+            )
+            self.stdout.write(
+                f"Review aggregates of {cursor.rowcount} products "
+                f"in {time.monotonic() - started_at:.1f}s"
+            )
+
+            # Totals use the same price after discount as checkout
+            started_at = time.monotonic()
+            totals, params = (
+                OrderItem.objects.filter(
+                    order__gte=self.order_first_id, order__lte=last_order_id
+                )
+                .order_by()
+                .values("order_id")
+                .annotate(
+                    total=Round(
+                        Sum(final_price_expression("product__") * F("quantity")), 2
+                    )
+                )
+                .query.sql_with_params()
+            )
+            cursor.execute(
+                f"""
+                UPDATE {order_table} AS orders SET total = totals.total
+                FROM ({totals}) AS totals
+                WHERE orders.id = totals.order_id
+                """,
+                params,
+            )
+            self.stdout.write(
+                f"Totals of {cursor.rowcount} orders "
+                f"in {time.monotonic() - started_at:.1f}s"
+            )
+
+            started_at = time.monotonic()
+            cursor.execute(
+                f"""
+                UPDATE {payment_table} AS payment SET amount = orders.total
+                FROM {order_table} AS orders
+                WHERE payment.order_id = orders.id
+                    AND orders.id BETWEEN %s AND %s
+                """,
+                [self.order_first_id, last_order_id],
+            )
+            self.stdout.write(
+                f"Amounts of {cursor.rowcount} payments "
+                f"in {time.monotonic() - started_at:.1f}s"
+            )
+
+    def analyze(self):
+        """Update planner statistics of the loaded tables"""
+        with connection.cursor() as cursor:
+            for model in (Product, Review, Order, OrderItem, Payment, CartItem):
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(f"ANALYZE {table}")
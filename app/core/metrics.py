@@ -0,0 +1,125 @@
+import glob
+import os
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# Under prefork servers and workers every process writes its metrics
+# to files in `PROMETHEUS_MULTIPROC_DIR`, values are kept in memory otherwise
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by view and action",
+    ["view", "action"],
+)
+RESPONSES = Counter(
+    "http_responses",
+    "Responses by view, action and status code",
+    ["view", "action", "status"],
+)
+DB_QUERIES = Counter(
+    "db_queries",
+    "Database queries by view and action",
+    ["view", "action"],
+)
+DB_QUERY_TIME = Counter(
+    "db_query_duration_seconds",
+    "Database time by view and action",
+    ["view", "action"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests",
+    "Cache lookups by cache and result",
+    ["cache", "result"],
+)
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Celery task run time",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, float("inf")),
+)
+TASKS = Counter(
+    "celery_tasks",
+    "Finished Celery tasks by state",
+    ["task", "state"],
+)
+
+
+class QueryStats:
+    """Number and time of database queries of a request"""
+
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Copied into threads running sync code of async requests
+request_queries = ContextVar("request_queries", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting queries of the current request"""
+    stats = request_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started_at = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.duration += time.perf_counter() - started_at
+
+
+def record_cache_access(cache_name, is_hit):
+    CACHE_REQUESTS.labels(cache_name, "hit" if is_hit else "miss").inc()
+
+
+def get_view_labels(request):
+    """Get the view name and the action of DRF viewsets or the method"""
+    match = request.resolver_match
+    if match is None:
+        # Don't label unknown paths, they are unbounded
+        return "unmatched", ""
+    method = request.method.lower()
+    actions = getattr(match.func, "actions", None) or {}
+    return match.view_name or match.route, actions.get(method, method)
+
+
+def record_request(request, response, duration, queries):
+    view, action = get_view_labels(request)
+    REQUEST_LATENCY.labels(view, action).observe(duration)
+    RESPONSES.labels(view, action, response.status_code).inc()
+    DB_QUERIES.labels(view, action).inc(queries.count)
+    DB_QUERY_TIME.labels(view, action).inc(queries.duration)
+
+
+class MetricsDirectoryCollector:
+    """
+    Merge metric files of all processes under the directory,
+    including subdirectories of other services sharing it
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def collect(self):
+        files = glob.glob(os.path.join(self.path, "**", "*.db"), recursive=True)
+        return MultiProcessCollector.merge(files, accumulate=True)
+
+
+def generate_metrics():
+    """Get metrics of all processes in the Prometheus text format"""
+    if not settings.METRICS_DIR:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    registry.register(MetricsDirectoryCollector(settings.METRICS_DIR))
+    return generate_latest(registry)
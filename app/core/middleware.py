@@ -0,0 +1,89 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from .metrics import QueryStats, record_request, request_queries
+from .queries import inspect_queries
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status code, database queries and time of every
+    request by view and action. Runs without a thread under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = QueryStats()
+        token = request_queries.set(queries)
+        started_at = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_queries.reset(token)
+        record_request(request, response, time.perf_counter() - started_at, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryStats()
+        token = request_queries.set(queries)
+        started_at = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_queries.reset(token)
+        record_request(request, response, time.perf_counter() - started_at, queries)
+        return response
+
+
+class QueryInspectorMiddleware:
+    """
+    Record SQL queries of every request with their call sites, log
+    N+1 queries and lazy loads of relations in loops per view.
+    Query count and database time are added to response headers
+    in debug mode. Enabled by `QUERY_INSPECTOR_ENABLED`, runs without
+    a thread under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with inspect_queries() as inspector:
+            response = self.get_response(request)
+            self.describe(request, response, inspector)
+        return response
+
+    async def __acall__(self, request):
+        with inspect_queries() as inspector:
+            response = await self.get_response(request)
+            self.describe(request, response, inspector)
+        return response
+
+    def describe(self, request, response, inspector):
+        """Label the report with the view, add query headers in debug mode"""
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        inspector.label = f"{request.method} {view_name}"
+        if settings.DEBUG:
+            response["X-Query-Count"] = inspector.count
+            response["X-Query-Time"] = f"{inspector.duration * 1000:.1f}"
+            response["X-Query-Repeats"] = len(inspector.get_repeated())
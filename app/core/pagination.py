@@ -0,0 +1,216 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date
+from decimal import Decimal
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination with an opt-in keyset (cursor) mode.
+
+    Passing the `cursor` query parameter (empty for the first page) switches
+    to keyset mode: the page is selected by the ordering values of the last
+    seen row instead of an offset and no `COUNT(*)` is run, so every page
+    costs the same. The active ordering is always finished with `id` to
+    break ties.
+    """
+
+    cursor_query_param = "cursor"
+    cursor_query_description = (
+        "Opaque keyset cursor. Pass an empty value to start keyset pagination."
+    )
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Plain lists, e.g. of cached rows, are always paginated by offset
+        self.keyset = self.cursor_query_param in request.query_params and isinstance(
+            queryset, QuerySet
+        )
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        queryset = self.get_keyset_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.get_keyset_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Paginate the queryset reading rows with the async ORM"""
+        self.keyset = self.cursor_query_param in request.query_params
+        if self.keyset:
+            queryset = self.get_keyset_queryset(queryset, request)
+            if queryset is None:
+                return None
+            return self.get_keyset_page([row async for row in queryset])
+
+        # Same as `LimitOffsetPagination.paginate_queryset`
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [row async for row in queryset[self.offset : self.offset + self.limit]]
+
+    def get_keyset_queryset(self, queryset, request):
+        """Get the queryset of the page rows, `None` when not paginated"""
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.ordering = self.get_ordering(queryset)
+        self.position, self.is_reversed = self.decode_cursor(request)
+        ordering = self.ordering
+        if self.is_reversed:
+            # Walk backwards from the cursor and restore the order afterwards
+            ordering = [self._invert(field) for field in ordering]
+        if self.position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, self.position))
+
+        # Fetch one extra row to know whether there is a following page
+        return queryset.order_by(*ordering)[: self.limit + 1]
+
+    def get_keyset_page(self, results):
+        """Get the page of fetched rows and set its links state"""
+        has_following = len(results) > self.limit
+        results = results[: self.limit]
+
+        if self.is_reversed:
+            results.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], is_reversed=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], is_reversed=True)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": self.cursor_query_description,
+                "schema": {"type": "string"},
+            },
+        ]
+
+    def get_ordering(self, queryset):
+        """Get the queryset ordering finished with the `id` tie-breaker"""
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        if not all(isinstance(field, str) for field in ordering):
+            raise TypeError("Keyset pagination supports only field name ordering")
+
+        ordering = ["id" if field == "pk" else field for field in ordering]
+        ordering = ["-id" if field == "-pk" else field for field in ordering]
+        if not any(field.lstrip("-") == "id" for field in ordering):
+            # Keep the tie-breaker direction in line with the main ordering
+            is_descending = bool(ordering) and ordering[0].startswith("-")
+            ordering.append("-id" if is_descending else "id")
+        return ordering
+
+    def get_keyset_filter(self, ordering, position):
+        """Build a filter for rows strictly following `position`"""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            lookup = "lt" if field.startswith("-") else "gt"
+            preceding = {
+                name.lstrip("-"): value
+                for name, value in zip(ordering[:index], position)
+            }
+            condition |= Q(
+                **preceding, **{f"{field.lstrip('-')}__{lookup}": position[index]}
+            )
+
+        # Inclusive bound on the leading column lets the database
+        # range-scan an index instead of evaluating the OR for every row
+        first = ordering[0]
+        lookup = "lte" if first.startswith("-") else "gte"
+        return Q(**{f"{first.lstrip('-')}__{lookup}": position[0]}) & condition
+
+    def encode_cursor(self, instance, is_reversed):
+        # Rows may be model instances or `.values()` dicts
+        get_value = dict.get if isinstance(instance, dict) else getattr
+        position = [
+            self._encode_value(get_value(instance, field.lstrip("-")))
+            for field in self.ordering
+        ]
+        data = {"o": self.ordering, "p": position, "r": is_reversed}
+        cursor = urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.offset_query_param)
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        """Get the cursor position and direction, `None` for the first page"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode()))
+            position, is_reversed = data["p"], bool(data["r"])
+            # Reject cursors issued for another ordering
+            is_valid = data["o"] == self.ordering and len(position) == len(
+                self.ordering
+            )
+        except (TypeError, ValueError, KeyError):
+            is_valid = False
+
+        if not is_valid:
+            raise NotFound(self.invalid_cursor_message)
+        return position, is_reversed
+
+    @staticmethod
+    def _encode_value(value):
+        # Keep full precision, datetimes must not lose their microseconds
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
@@ -0,0 +1,178 @@
+import logging
+import os
+import re
+import sys
+import sysconfig
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lazy loads of related objects go through `__get__` of these descriptors
+RELATED_DESCRIPTORS = os.path.join(
+    "django", "db", "models", "fields", "related_descriptors.py"
+)
+# Frames of Django, DRF and other libraries are skipped to find call sites
+LIBRARY_DIRS = tuple(
+    {
+        os.path.join(sysconfig.get_path(name), "")
+        for name in ("stdlib", "platstdlib", "purelib", "platlib")
+    }
+)
+# Execute wrappers around the query, they are not its call site
+WRAPPER_FILES = (__file__, metrics.__file__)
+# Lists of placeholders differ only by the number of values
+PLACEHOLDERS_RE = re.compile(r"\((?:%s, )+%s\)")
+
+RecordedQuery = namedtuple(
+    "RecordedQuery", ["sql", "shape", "duration", "call_site", "relation"]
+)
+
+
+class NPlusOneError(Exception):
+    """Queries repeated by a loop, raised when `QUERY_INSPECTOR_RAISE` is set"""
+
+
+def _describe_relation(descriptor):
+    """Get `Model.attribute` name of the relation loaded by a descriptor"""
+    field = getattr(descriptor, "field", None)
+    if field is not None:
+        return f"{field.model.__name__}.{field.name}"
+    related = getattr(descriptor, "related", None)
+    if related is not None:
+        return f"{related.model.__name__}.{related.get_accessor_name()}"
+    return None
+
+
+def _inspect_stack(frame):
+    """
+    Get the call site of a query outside libraries and the relation
+    if the query lazily loads a related object
+    """
+    relation = None
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename
+        if filename.endswith(RELATED_DESCRIPTORS):
+            if relation is None and code.co_name == "__get__":
+                relation = _describe_relation(frame.f_locals.get("self"))
+        elif not filename.startswith(LIBRARY_DIRS) and filename not in WRAPPER_FILES:
+            base_dir = os.path.join(settings.BASE_DIR, "")
+            if filename.startswith(base_dir):
+                filename = filename[len(base_dir) :]
+            return f"{filename}:{frame.f_lineno} in {code.co_name}", relation
+        frame = frame.f_back
+    return "unknown", relation
+
+
+class QueryInspector:
+    """
+    Queries recorded with their duration and call site. Queries
+    of the same shape made from the same place at least `threshold`
+    times are reported as N+1 problems.
+    """
+
+    def __init__(self, label="", threshold=None):
+        self.label = label
+        self.threshold = threshold or settings.QUERY_INSPECTOR_THRESHOLD
+        self.queries = []
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
+
+    def get_repeated(self):
+        """Get lists of queries repeated from the same place, most first"""
+        groups = {}
+        for query in self.queries:
+            groups.setdefault((query.shape, query.call_site), []).append(query)
+        repeated = [
+            group for group in groups.values() if len(group) >= self.threshold
+        ]
+        return sorted(repeated, key=len, reverse=True)
+
+    def get_problems(self):
+        """Describe repeated queries and lazy loads of relations in loops"""
+        problems = []
+        for group in self.get_repeated():
+            query = group[0]
+            if query.relation is not None:
+                problems.append(
+                    f"lazy load of {query.relation} repeated {len(group)} times "
+                    f"at {query.call_site}"
+                )
+            else:
+                problems.append(
+                    f"query repeated {len(group)} times at {query.call_site}: "
+                    f"{query.shape}"
+                )
+        return problems
+
+    def report(self, raise_problems=None):
+        """Log found problems or raise `NPlusOneError` if asked to"""
+        if raise_problems is None:
+            raise_problems = settings.QUERY_INSPECTOR_RAISE
+        logger.debug(
+            "%s: %d queries in %.1f ms",
+            self.label,
+            self.count,
+            self.duration * 1000,
+        )
+        problems = self.get_problems()
+        if problems and raise_problems:
+            raise NPlusOneError(f"{self.label}: " + "; ".join(problems))
+        for problem in problems:
+            logger.warning("%s: %s", self.label, problem)
+
+
+# Inspectors of the enclosing `inspect_queries()` blocks, copied into
+# threads running sync code of async views
+active_inspectors = ContextVar("active_inspectors", default=())
+
+
+def inspect_query(execute, sql, params, many, context):
+    """Database execute wrapper recording queries for active inspectors"""
+    inspectors = active_inspectors.get()
+    if not inspectors:
+        return execute(sql, params, many, context)
+    started_at = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started_at
+        call_site, relation = _inspect_stack(sys._getframe(1))
+        query = RecordedQuery(
+            sql=sql,
+            shape=PLACEHOLDERS_RE.sub("(...)", sql),
+            duration=duration,
+            call_site=call_site,
+            relation=relation,
+        )
+        for inspector in inspectors:
+            inspector.queries.append(query)
+
+
+@contextmanager
+def inspect_queries(label="", threshold=None, raise_problems=None):
+    """
+    Record queries made inside the block, also by sync code it runs
+    in other threads, report N+1 problems on exit. E.g. in tests:
+
+        with inspect_queries(raise_problems=True):
+            client.get(url)
+    """
+    inspector = QueryInspector(label, threshold)
+    token = active_inspectors.set((*active_inspectors.get(), inspector))
+    try:
+        yield inspector
+    finally:
+        active_inspectors.reset(token)
+    inspector.report(raise_problems)
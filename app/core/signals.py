@@ -0,0 +1,34 @@
+import time
+from celery.signals import task_postrun, task_prerun
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from .metrics import TASK_DURATION, TASKS, record_query
+from .queries import inspect_query
+
+# Start times of running tasks by task id
+task_started_at = {}
+
+
+@receiver(connection_created)
+def install_query_recorders(sender, connection, **kwargs):
+    """
+    Count queries of every connection, also opened outside requests,
+    and record them for active query inspectors
+    """
+    # The signal is sent again when a connection reconnects
+    for wrapper in (record_query, inspect_query):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, **kwargs):
+    task_started_at[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task(task_id=None, task=None, state=None, **kwargs):
+    started_at = task_started_at.pop(task_id, None)
+    if started_at is not None:
+        TASK_DURATION.labels(task.name).observe(time.perf_counter() - started_at)
+    TASKS.labels(task.name, state or "UNKNOWN").inc()
@@ -0,0 +1,31 @@
+from celery import shared_task
+from django.apps import apps
+from django.db import transaction
+from .images import delete_image_variants, generate_image_variants
+
+
+@shared_task
+def create_image_variants(model_label, pk, field_name):
+    """Create resized variants of the model instance's image"""
+    model = apps.get_model(model_label)
+    variants_field = f"{field_name}_variants"
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    image = getattr(instance, field_name)
+    variants = generate_image_variants(image) if image else {}
+
+    with transaction.atomic():
+        instance = model.objects.select_for_update().filter(pk=pk).first()
+        # Drop the result if the image was changed or deleted meanwhile
+        current_name = instance and getattr(instance, field_name).name
+        if instance is None or (current_name or None) != (image.name or None):
+            delete_image_variants(variants, image.storage)
+            return
+
+        previous_variants = getattr(instance, variants_field)
+        setattr(instance, variants_field, variants)
+        instance.save(update_fields=[variants_field])
+
+    delete_image_variants(previous_variants, image.storage)
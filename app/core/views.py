@@ -0,0 +1,117 @@
+from asgiref.sync import sync_to_async, iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.shortcuts import aget_object_or_404
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .metrics import generate_metrics
+
+
+class AsyncAPIViewMixin:
+    """
+    Run a DRF view as a coroutine under ASGI, handlers are `async def`.
+    Authentication, permission and throttle checks may query the
+    database or cache, so they run in a thread of the request.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            # Get the appropriate handler method
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self, request.method.lower(), self.http_method_not_allowed
+                )
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                # E.g. `options` and `http_method_not_allowed` of DRF
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncAPIView(AsyncAPIViewMixin, APIView):
+    """Base async API view"""
+
+
+class AsyncGenericAPIView(AsyncAPIViewMixin, GenericAPIView):
+    """
+    Base async generic view reading objects with the async ORM.
+    Filter backends run in a thread, as filter sets may query
+    the database to validate parameters.
+    """
+
+    async def afilter_queryset(self, queryset):
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await aget_object_or_404(
+                queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(
+            queryset, self.request, view=self
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(
+            [obj async for obj in queryset], many=True
+        )
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+
+def metrics(request):
+    """
+    Expose metrics of all processes in the Prometheus text format.
+    Scrapes authenticate with `METRICS_TOKEN` as a bearer token,
+    without the token metrics are exposed in debug mode only.
+    """
+    if settings.METRICS_TOKEN:
+        authorization = request.headers.get("Authorization", "")
+        if not constant_time_compare(
+            authorization, f"Bearer {settings.METRICS_TOKEN}"
+        ):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        raise Http404
+    return HttpResponse(generate_metrics(), content_type=CONTENT_TYPE_LATEST)
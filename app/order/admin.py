@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Order, OrderItem, Payment
+from .models import Order, OrderItem, Payment, PaymentEvent
 
 admin.site.register(Order)
 admin.site.register(OrderItem)
 admin.site.register(Payment)
+admin.site.register(PaymentEvent)
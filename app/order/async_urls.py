@@ -0,0 +1,13 @@
+from django.urls import path
+from .views import AsyncPaymentCreateView
+
+# Async views waiting for the payment gateway, served under ASGI
+app_name = "order-async"
+
+urlpatterns = [
+    path(
+        "orders/<int:order_pk>/create-payment/",
+        AsyncPaymentCreateView.as_view(),
+        name="create-payment",
+    ),
+]
@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import time
+import weakref
+from functools import lru_cache
+import httpx
+import redis
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds of the call latency histogram buckets
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+GATEWAY_OUTCOMES = ("succeeded", "failed", "retried")
+# Statuses meaning the request may succeed if repeated
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class PaymentGatewayError(APIException):
+    """The payment gateway failed or did not answer in time"""
+
+    status_code = 502
+    default_detail = "Payment gateway is unavailable, try again later."
+    default_code = "payment_gateway_error"
+
+
+def _stats_key(operation, name):
+    return f"payments:gateway:{operation}:{name}"
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The counter does not exist yet
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+async def _aincrement(key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, timeout=None):
+            await cache.aincr(key)
+
+
+def _latency_bucket(latency):
+    return next((bound for bound in LATENCY_BUCKETS if latency * 1000 <= bound), "inf")
+
+
+def record_gateway_call(operation, outcome, latency=None):
+    """
+    Count the gateway call outcome and its latency in seconds.
+    Stats are best-effort: the call is done by now, e.g. the payment is
+    created, so a cache failure is logged instead of failing the request.
+    """
+    try:
+        _increment(_stats_key(operation, outcome))
+        if latency is not None:
+            _increment(_stats_key(operation, f"latency:{_latency_bucket(latency)}"))
+    except redis.RedisError:
+        logger.warning("Gateway call stats of %s are not recorded", operation)
+
+
+async def arecord_gateway_call(operation, outcome, latency=None):
+    """Async counterpart of `record_gateway_call`"""
+    try:
+        await _aincrement(_stats_key(operation, outcome))
+        if latency is not None:
+            await _aincrement(
+                _stats_key(operation, f"latency:{_latency_bucket(latency)}")
+            )
+    except redis.RedisError:
+        logger.warning("Gateway call stats of %s are not recorded", operation)
+
+
+def _stats_names():
+    buckets = [*LATENCY_BUCKETS, "inf"]
+    return [*GATEWAY_OUTCOMES, *(f"latency:{bucket}" for bucket in buckets)]
+
+
+def get_gateway_stats(operation):
+    """Get call outcomes and latency histogram of the gateway operation"""
+    keys = {name: _stats_key(operation, name) for name in _stats_names()}
+    counters = cache.get_many(keys.values())
+    stats = {"latency": {}}
+    for name, key in keys.items():
+        if name.startswith("latency:"):
+            stats["latency"][name.split(":")[1]] = counters.get(key, 0)
+        else:
+            stats[name] = counters.get(key, 0)
+    return stats
+
+
+def reset_gateway_stats(operation):
+    cache.delete_many([_stats_key(operation, name) for name in _stats_names()])
+
+
+def build_payment_payload(order, return_url):
+    """Build YooKassa payment of the order, `order.user` must be loaded"""
+    return {
+        # TODO: include commission to amount
+        "amount": {
+            "value": str(order.total),
+            "currency": "RUB",
+        },
+        "confirmation": {
+            "type": "redirect",
+            "return_url": return_url,
+        },
+        "capture": True,
+        "description": f"Оплата заказа №{order.id} для {order.user.email}",
+        "metadata": {"order_id": order.id},
+    }
+
+
+class YookassaClient:
+    """
+    YooKassa API client reusing pooled keep-alive connections.
+
+    Every call has a deadline: no attempt starts after it and timeouts
+    of an attempt never exceed the time left. `requests` applies the
+    read timeout to each socket read rather than to the whole response,
+    so a server trickling its response can still overrun the deadline.
+    Failed connections, timeouts, throttling and server errors are retried
+    with the same idempotence key, so a payment is never created twice.
+    """
+
+    def __init__(
+        self,
+        api_url,
+        account_id,
+        secret_key,
+        deadline=10,
+        connect_timeout=3,
+        max_retries=2,
+        pool_size=10,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+
+        self.session = requests.Session()
+        self.session.auth = (account_id or "", secret_key or "")
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def create_payment(self, payload, idempotence_key):
+        """Create a payment, return the payment object"""
+        return self.request(
+            "payments", "POST", "/payments", payload, str(idempotence_key)
+        )
+
+    def request(self, operation, method, path, payload, idempotence_key):
+        started_at = time.monotonic()
+        deadline_at = started_at + self.deadline
+        headers = {"Idempotence-Key": idempotence_key}
+
+        response = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                response = self.session.request(
+                    method,
+                    f"{self.api_url}{path}",
+                    json=payload,
+                    headers=headers,
+                    # Never wait longer than the rest of the deadline
+                    timeout=(min(self.connect_timeout, remaining), remaining),
+                )
+            except requests.RequestException:
+                response = None
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                break
+
+            if attempt < self.max_retries:
+                record_gateway_call(operation, "retried")
+                # Back off exponentially within the deadline
+                backoff = min(0.2 * 2**attempt, deadline_at - time.monotonic())
+                time.sleep(max(backoff, 0))
+
+        latency = time.monotonic() - started_at
+        if response is None or not response.ok:
+            record_gateway_call(operation, "failed", latency)
+            raise PaymentGatewayError()
+
+        record_gateway_call(operation, "succeeded", latency)
+        return response.json()
+
+
+class AsyncYookassaClient:
+    """
+    Async counterpart of `YookassaClient` on a pooled `httpx` client,
+    so one ASGI worker can wait for many gateway calls at once. Here
+    the deadline is strict, it also bounds reading of slow responses.
+    """
+
+    def __init__(
+        self,
+        api_url,
+        account_id,
+        secret_key,
+        deadline=10,
+        connect_timeout=3,
+        max_retries=2,
+        pool_size=100,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+
+        self.client = httpx.AsyncClient(
+            auth=(account_id or "", secret_key or ""),
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+        )
+
+    async def create_payment(self, payload, idempotence_key):
+        """Create a payment, return the payment object"""
+        return await self.request(
+            "payments", "POST", "/payments", payload, str(idempotence_key)
+        )
+
+    async def request(self, operation, method, path, payload, idempotence_key):
+        started_at = time.monotonic()
+        deadline_at = started_at + self.deadline
+        headers = {"Idempotence-Key": idempotence_key}
+
+        response = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                response = await asyncio.wait_for(
+                    self.client.request(
+                        method,
+                        f"{self.api_url}{path}",
+                        json=payload,
+                        headers=headers,
+                        timeout=httpx.Timeout(
+                            remaining, connect=min(self.connect_timeout, remaining)
+                        ),
+                    ),
+                    # Never wait longer than the rest of the deadline
+                    remaining,
+                )
+            except (httpx.HTTPError, asyncio.TimeoutError):
+                response = None
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                break
+
+            if attempt < self.max_retries:
+                await arecord_gateway_call(operation, "retried")
+                # Back off exponentially within the deadline
+                backoff = min(0.2 * 2**attempt, deadline_at - time.monotonic())
+                await asyncio.sleep(max(backoff, 0))
+
+        latency = time.monotonic() - started_at
+        if response is None or response.is_error:
+            await arecord_gateway_call(operation, "failed", latency)
+            raise PaymentGatewayError()
+
+        await arecord_gateway_call(operation, "succeeded", latency)
+        return response.json()
+
+
+@lru_cache
+def get_payment_gateway():
+    """Get YooKassa client shared by the process"""
+    return YookassaClient(
+        api_url=settings.YOOKASSA_API_URL,
+        account_id=settings.YOOKASSA_ACCOUNT_ID,
+        secret_key=settings.YOOKASSA_SECRET_KEY,
+        deadline=settings.YOOKASSA_DEADLINE,
+        connect_timeout=settings.YOOKASSA_CONNECT_TIMEOUT,
+        max_retries=settings.YOOKASSA_MAX_RETRIES,
+        pool_size=settings.YOOKASSA_POOL_SIZE,
+    )
+
+
+# Async clients are bound to the event loop they were created in
+_async_payment_gateways = weakref.WeakKeyDictionary()
+
+
+def get_async_payment_gateway():
+    """Get async YooKassa client shared by the running event loop"""
+    loop = asyncio.get_running_loop()
+    if loop not in _async_payment_gateways:
+        _async_payment_gateways[loop] = AsyncYookassaClient(
+            api_url=settings.YOOKASSA_API_URL,
+            account_id=settings.YOOKASSA_ACCOUNT_ID,
+            secret_key=settings.YOOKASSA_SECRET_KEY,
+            deadline=settings.YOOKASSA_DEADLINE,
+            connect_timeout=settings.YOOKASSA_CONNECT_TIMEOUT,
+            max_retries=settings.YOOKASSA_MAX_RETRIES,
+            pool_size=settings.YOOKASSA_ASYNC_POOL_SIZE,
+        )
+    return _async_payment_gateways[loop]
@@ -1,18 +1,90 @@
+import time
 from datetime import timedelta
 from django.utils import timezone
 from django.core.management.base import BaseCommand
-from order.models import Order
+from django.db import transaction
+from django.db.models import Sum
+from core.locks import advisory_lock
+from order.models import Order, OrderItem
+from order.services import delete_orders
+from product.cache import invalidate_catalog
+from product.models import Product
 
 
 class Command(BaseCommand):
-    """Django command to delete unpaid orders older than 3 hours"""
+    """
+    Django command to delete unpaid orders older than 3 hours.
+    Orders are deleted in short batches, each returns the ordered
+    quantities to stock with one update.
+    """
 
-    def handle(self, *args, **kwargs):
-        time_threshold = timezone.now() - timedelta(hours=3)
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--hours", type=int, default=3)
+
+    def handle(self, *args, **options):
+        # Workers on every node run the periodic task, only one deletes
+        with advisory_lock("delete_unpaid_orders") as is_acquired:
+            if not is_acquired:
+                self.stdout.write("Unpaid orders are being deleted by another worker.")
+                return
+            self.delete_orders(options["batch_size"], options["hours"])
+
+    def delete_orders(self, batch_size, hours):
+        time_threshold = timezone.now() - timedelta(hours=hours)
         unpaid_orders = Order.objects.filter(
             is_paid=False,
             created_at__lt=time_threshold,
         )
-        count = unpaid_orders.count()
-        unpaid_orders.delete()
-        self.stdout.write(f"Deleted {count} unpaid orders.")
+
+        started_at = time.monotonic()
+        count = 0
+        while True:
+            batch_started_at = time.monotonic()
+            deleted, products = self.delete_batch(unpaid_orders, batch_size)
+            if not deleted:
+                break
+
+            count += deleted
+            self.stdout.write(
+                f"Deleted {deleted} orders, restored stock of {products} products "
+                f"in {(time.monotonic() - batch_started_at) * 1000:.0f}ms"
+            )
+
+        elapsed = time.monotonic() - started_at
+        self.stdout.write(f"Deleted {count} unpaid orders in {elapsed:.1f}s.")
+
+    @transaction.atomic
+    def delete_batch(self, unpaid_orders, batch_size):
+        """Delete a batch of orders, return numbers of orders and products"""
+        # Orders being paid or cancelled meanwhile are left for the next run
+        order_ids = list(
+            unpaid_orders.order_by("id")
+            .select_for_update(skip_locked=True)
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0, 0
+
+        order_items = OrderItem.objects.filter(order_id__in=order_ids)
+        quantities = dict(
+            order_items.order_by()
+            .values_list("product_id")
+            .annotate(quantity=Sum("quantity"))
+        )
+        # Lock products in primary key order like checkout does,
+        # so the stock update can't deadlock with it
+        list(
+            Product.objects.filter(pk__in=quantities)
+            .order_by("pk")
+            .select_for_update()
+            .values_list("pk")
+        )
+        Product.objects.return_stock_bulk(quantities)
+
+        # Stock is already restored, delete the rows without loading them
+        delete_orders(order_ids)
+
+        for product_id in quantities:
+            invalidate_catalog("products", product_id)
+        return len(order_ids), len(quantities)
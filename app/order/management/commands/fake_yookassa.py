@@ -0,0 +1,127 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class FakeYookassaHandler(BaseHTTPRequestHandler):
+    """Answer YooKassa payment API calls like the real gateway"""
+
+    # Keep connections alive like the real API
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.delay()
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.rstrip("/") != "/v3/payments":
+            return self.respond(404, {"type": "error", "code": "not_found"})
+        if self.headers.get("Authorization") is None:
+            return self.respond(401, {"type": "error", "code": "invalid_credentials"})
+
+        key = self.headers.get("Idempotence-Key")
+        if not key:
+            return self.respond(400, {"type": "error", "code": "invalid_request"})
+        if random.random() < self.server.error_rate:
+            return self.respond(500, {"type": "error", "code": "internal_server_error"})
+
+        with self.server.lock:
+            # Repeated request returns the payment created by the first one
+            payment = self.server.payments.get(key)
+            if payment is None:
+                payment = self.create_payment(json.loads(body or "{}"))
+                self.server.payments[key] = payment
+        self.respond(200, payment)
+
+    def do_GET(self):
+        self.delay()
+        payment_id = self.path.rstrip("/").rsplit("/", 1)[-1]
+        with self.server.lock:
+            payments = {p["id"]: p for p in self.server.payments.values()}
+        if payment_id not in payments:
+            return self.respond(404, {"type": "error", "code": "not_found"})
+        self.respond(200, payments[payment_id])
+
+    def create_payment(self, data):
+        payment_id = str(uuid.uuid4())
+        return {
+            "id": payment_id,
+            "status": "pending",
+            "paid": False,
+            "amount": data.get("amount"),
+            "description": data.get("description"),
+            "metadata": data.get("metadata", {}),
+            "confirmation": {
+                "type": "redirect",
+                "confirmation_url": (
+                    f"http://{self.headers.get('Host')}/payments/{payment_id}/confirm"
+                ),
+            },
+            "created_at": timezone.now().isoformat(),
+            "test": True,
+        }
+
+    def delay(self):
+        latency = self.server.latency
+        if latency:
+            time.sleep(random.uniform(latency / 2, latency * 1.5) / 1000)
+
+    def respond(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class Command(BaseCommand):
+    """
+    Django command to run a local stand-in of the YooKassa payment API
+    for development, tests and load benchmarks. Point the app at it with
+    `YOOKASSA_API_URL=http://localhost:8001/v3`.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument(
+            "--latency",
+            type=int,
+            default=0,
+            help="Average response latency in milliseconds.",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0,
+            help="Share of payment creations failing with 500, e.g. 0.1.",
+        )
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(
+            (options["host"], options["port"]), FakeYookassaHandler
+        )
+        server.daemon_threads = True
+        server.latency = options["latency"]
+        server.error_rate = options["error_rate"]
+        server.verbose = options["verbosity"] > 1
+        server.payments = {}
+        server.lock = threading.Lock()
+
+        self.stdout.write(
+            f"Fake YooKassa API at http://{options['host']}:{options['port']}/v3"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
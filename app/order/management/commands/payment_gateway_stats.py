@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from order.gateway import LATENCY_BUCKETS, get_gateway_stats, reset_gateway_stats
+
+
+class Command(BaseCommand):
+    """Django command to show YooKassa call outcomes and latencies"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counters.",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_gateway_stats("payments")
+        self.stdout.write(
+            f"payments: {stats['succeeded']} succeeded, {stats['failed']} failed, "
+            f"{stats['retried']} retries"
+        )
+        for bucket, count in stats["latency"].items():
+            if bucket == "inf":
+                label = f"> {LATENCY_BUCKETS[-1]}ms"
+            else:
+                label = f"<= {bucket}ms"
+            self.stdout.write(f"  {label}: {count}")
+
+        if options["reset"]:
+            reset_gateway_stats("payments")
+            self.stdout.write("Gateway stats are reset.")
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0003_alter_payment_currency_alter_payment_status'),
+        ('user', '0006_remove_cart_total'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_at_id_idx'),
+        ),
+    ]
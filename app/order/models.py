@@ -23,6 +23,15 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination index for user's orders
+            models.Index(
+                fields=["user", "created_at", "id"],
+                name="order_user_created_at_id_idx",
+            ),
+        ]
+
 
 class OrderItem(models.Model):
     """Cart item model"""
@@ -79,3 +88,27 @@ class Payment(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+
+class PaymentEvent(models.Model):
+    """YooKassa notification stored for background processing"""
+
+    # Event and payment id, a redelivered notification has the same one
+    event_id = models.CharField(max_length=255, unique=True)
+    event = models.CharField(max_length=50)
+    payload = models.JSONField()
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # Events waiting for their payment are not taken again before this time
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Queue of events waiting for processing
+            models.Index(
+                fields=["created_at", "id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="order_paymentevent_pending_idx",
+            ),
+        ]
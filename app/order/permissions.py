@@ -1,7 +1,6 @@
 import ipaddress
-from django.shortcuts import get_object_or_404
 from rest_framework.permissions import BasePermission
-from .models import Order
+from user.context import get_user_context
 
 
 class DoesUserHaveAddress(BasePermission):
@@ -10,8 +9,7 @@ class DoesUserHaveAddress(BasePermission):
     message = "User must have an address to make orders!"
 
     def has_permission(self, request, view):
-        shipping_address = getattr(request.user, "shipping_address", None)
-        if not shipping_address:
+        if not get_user_context(request).shipping_address:
             return False
         return True
 
@@ -22,7 +20,7 @@ class IsCartNotEmpty(BasePermission):
     message = "Your cart is empty!"
 
     def has_permission(self, request, view):
-        if not request.user.cart.cart_items.all():
+        if not get_user_context(request).has_cart_items:
             return False
         return True
 
@@ -33,8 +31,8 @@ class IsOrderNotPaid(BasePermission):
     message = "This order is already paid!"
 
     def has_permission(self, request, view):
-        order_id = view.kwargs.get("order_pk")
-        order = get_object_or_404(Order, pk=order_id)
+        # Fetched once for the view, other users' orders are not found
+        order = get_user_context(request).get_order(view.kwargs.get("order_pk"))
         if order.is_paid:
             return False
         return True
@@ -24,3 +24,15 @@ class YookassaPaymentResponseSerializer(serializers.Serializer):
     """Serializer for confirmation url return"""
 
     confirmation_url = serializers.URLField()
+
+
+class YookassaNotificationSerializer(serializers.Serializer):
+    """Serializer for yookassa webhook notifications"""
+
+    event = serializers.CharField(max_length=50)
+    object = serializers.DictField()
+
+    def validate_object(self, value):
+        if not value.get("id"):
+            raise ValidationError("Payment id is required.")
+        return value
@@ -0,0 +1,194 @@
+import logging
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from product.cache import invalidate_catalog
+from product.models import Product
+from user.models import CartItem
+from .models import Order, OrderItem, Payment, PaymentEvent
+
+OUT_OF_STOCK_MESSAGE = (
+    "The quantity of ordered items exceeds product quantity in stock"
+)
+
+# Payment status set by each processed notification
+EVENT_STATUSES = {
+    "payment.succeeded": Payment.SUCCEEDED,
+    "payment.canceled": Payment.CANCELED,
+}
+# Statuses a payment can move to, final statuses never change
+PAYMENT_TRANSITIONS = {
+    Payment.PENDING: {Payment.SUCCEEDED, Payment.CANCELED},
+}
+# How long a notification waits for its payment to be saved
+PAYMENT_EVENT_WAIT = timedelta(hours=1)
+# Delay between lookups of the payment of a waiting notification
+PAYMENT_EVENT_RETRY_DELAY = timedelta(minutes=1)
+
+logger = logging.getLogger(__name__)
+
+
+@transaction.atomic
+def checkout(user, shipping_address=None, quantities=None):
+    """
+    Turn the user's cart into an order in one transaction.
+    Runs a fixed number of queries regardless of the cart size:
+    products are locked, stock is validated and taken in one
+    statement, order items are inserted in bulk and the cart is cleared.
+    Cart `quantities` by product id already read by the caller
+    are used as is, otherwise they are read from the database.
+    """
+    if quantities is None:
+        quantities = dict(
+            CartItem.objects.filter(cart_id=user.pk).values_list(
+                "product_id", "quantity"
+            )
+        )
+    if not quantities:
+        raise ValidationError({"detail": "Your cart is empty!"})
+
+    # Lock products in primary key order, so concurrent checkouts
+    # of overlapping carts can't deadlock
+    products = list(
+        Product.objects.with_final_price()
+        .filter(pk__in=quantities)
+        .only("name", "qty_in_stock", "price")
+        .order_by("pk")
+        .select_for_update(of=("self",))
+    )
+
+    out_stock_errors = {
+        product.name: f"{quantities[product.pk]} > {product.qty_in_stock}"
+        for product in products
+        if quantities[product.pk] > product.qty_in_stock
+    }
+    if out_stock_errors:
+        raise ValidationError(
+            {"detail": OUT_OF_STOCK_MESSAGE, "products": out_stock_errors}
+        )
+
+    total = sum(product.final_price * quantities[product.pk] for product in products)
+    order = Order.objects.create(
+        user=user,
+        shipping_address=shipping_address,
+        total=round(total, 2),
+    )
+    # Bulk insert sends no signals, the stock is taken below at once
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=product, quantity=quantities[product.pk])
+        for product in products
+    )
+    Product.objects.take_stock_bulk(
+        {product.pk: quantities[product.pk] for product in products}
+    )
+    CartItem.objects.filter(cart_id=user.pk).delete()
+
+    for product in products:
+        invalidate_catalog("products", product.pk)
+    return order
+
+
+def delete_orders(order_ids):
+    """
+    Delete orders with their items and payments by primary keys,
+    one statement per table. Rows are not loaded and no signals are sent,
+    so the caller returns the stock of the items itself.
+    Return the number of deleted orders.
+    """
+    # `.delete()` would load every order and item and the stock signals
+    # would return it again order by order. Nothing else listens to
+    # deletion of these models.
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for model, column in (
+            (OrderItem, "order_id"),
+            (Payment, "order_id"),
+            (Order, "id"),
+        ):
+            cursor.execute(
+                f"DELETE FROM {quote_name(model._meta.db_table)} "
+                f"WHERE {quote_name(column)} = ANY(%s)",
+                [list(order_ids)],
+            )
+        return cursor.rowcount
+
+
+def _get_event_order_id(event):
+    try:
+        return int(event.payload["object"]["metadata"]["order_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+@transaction.atomic
+def process_payment_events(batch_size=100):
+    """
+    Apply a batch of stored payment notifications in the order they
+    came in. Redelivered and outdated notifications change nothing,
+    so processing is idempotent. Notifications that outrun saving of
+    their payment are retried later without holding up the queue.
+    Return the number of events taken from the queue.
+    """
+    now = timezone.now()
+    # Concurrent workers take different batches
+    events = list(
+        PaymentEvent.objects.filter(
+            Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+            processed_at__isnull=True,
+        )
+        .order_by("created_at", "id")
+        .select_for_update(skip_locked=True)[:batch_size]
+    )
+    if not events:
+        return 0
+
+    order_ids = {_get_event_order_id(event) for event in events}
+    payments = {
+        payment.order_id: payment
+        for payment in Payment.objects.filter(order_id__in=order_ids)
+        .order_by("pk")
+        .select_for_update()
+    }
+
+    processed_events = []
+    waiting_events = []
+    changed_payments = {}
+    for event in events:
+        order_id = _get_event_order_id(event)
+        payment = payments.get(order_id)
+        if order_id is None:
+            # No payment will ever match, don't retry the event
+            logger.warning("Payment event %s has no order id", event.event_id)
+        elif payment is None:
+            # The notification may outrun saving of the payment
+            if event.created_at > now - PAYMENT_EVENT_WAIT:
+                waiting_events.append(event.pk)
+                continue
+        else:
+            status = EVENT_STATUSES.get(event.event)
+            if status in PAYMENT_TRANSITIONS.get(payment.status, ()):
+                payment.status = status
+                payment.updated_at = now
+                if status == Payment.SUCCEEDED:
+                    payment_method = event.payload["object"].get("payment_method")
+                    payment.payment_method = (payment_method or {}).get("type", "")
+                changed_payments[payment.pk] = payment
+        processed_events.append(event.pk)
+
+    Payment.objects.bulk_update(
+        changed_payments.values(), ["status", "payment_method", "updated_at"]
+    )
+    Order.objects.filter(
+        pk__in=[
+            payment.order_id
+            for payment in changed_payments.values()
+            if payment.status == Payment.SUCCEEDED
+        ]
+    ).update(is_paid=True, updated_at=now)
+    PaymentEvent.objects.filter(pk__in=processed_events).update(processed_at=now)
+    PaymentEvent.objects.filter(pk__in=waiting_events).update(
+        next_attempt_at=now + PAYMENT_EVENT_RETRY_DELAY
+    )
+    return len(events)
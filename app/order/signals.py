@@ -1,7 +1,11 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models import Exists, QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete
 from rest_framework.exceptions import ValidationError
+from product.cache import invalidate_catalog
+from product.models import Product
 from .models import Order, OrderItem
+from .services import OUT_OF_STOCK_MESSAGE
 
 
 @receiver(post_save, sender=OrderItem)
@@ -9,53 +13,58 @@ def reserve_product_quantity(sender, instance, created, **kwargs):
     """
     Reserve the product quantity for order item
     """
-    if created:
-        product = instance.product
-        product.qty_in_stock -= instance.quantity
-        product.save()
+    if not created:
+        return
+
+    # Conditional update, concurrent orders can't oversell the product
+    if not Product.objects.take_stock(instance.product_id, instance.quantity):
+        product = Product.objects.only("name", "qty_in_stock").get(
+            pk=instance.product_id
+        )
+        raise ValidationError(
+            {
+                "detail": OUT_OF_STOCK_MESSAGE,
+                "products": {
+                    product.name: f"{instance.quantity} > {product.qty_in_stock}"
+                },
+            }
+        )
+    invalidate_catalog("products", instance.product_id)
 
 
-@receiver(post_delete, sender=OrderItem)
-def restore_product_quantity(sender, instance, **kwargs):
+@receiver(pre_delete, sender=Order)
+def restore_order_stock(sender, instance, **kwargs):
     """
-    Restore the product quantity if not paid order is deleted/canceled
-    (with it's order items)
+    Restore product quantities of a not paid order before it is deleted
+    with its items, in one update for all of them
     """
-    # Skip restoring if the order is paid
-    if instance.order.is_paid:
+    # Deleted orders are loaded, so checking the payment costs no query
+    if instance.is_paid:
         return
-    product = instance.product
-    product.qty_in_stock += instance.quantity
-    product.save()
-
-
-@receiver(post_save, sender=Order)
-def create_order_items(sender, instance, created, **kwargs):
-    """Create order items for just created order"""
-    if not created:
+    quantities = dict(instance.order_items.values_list("product_id", "quantity"))
+    if not quantities:
         return
+    Product.objects.return_stock_bulk(quantities)
+    for product_id in quantities:
+        invalidate_catalog("products", product_id)
 
-    user = instance.user
-    out_stock_errors = {}
-    # Create order items based on cart items
-    for item in user.cart.cart_items.all():
-        # Collect out of stock errors, if present
-        if item.quantity > item.product.qty_in_stock:
-            out_stock_errors[item.product.name] = (
-                f"{item.quantity} > {item.product.qty_in_stock}"
-            )
-            continue
-
-        instance.order_items.create(
-            product=item.product,
-            quantity=item.quantity,
-        )
 
-    if out_stock_errors:
-        error = {
-            "detail": "The quantity of ordered items exceeds product quantity in stock",
-            "products": out_stock_errors,
-        }
-        instance.delete()
-        # TODO: Make this return user friendly error msg in admin panel
-        raise ValidationError(error)
+@receiver(post_delete, sender=OrderItem)
+def restore_product_quantity(sender, instance, origin=None, **kwargs):
+    """
+    Restore the product quantity if an order item of not paid order
+    is deleted on its own
+    """
+    # Items deleted with their order are restored by `restore_order_stock`,
+    # items deleted with their product have no stock to return
+    is_deleted_directly = isinstance(origin, OrderItem) or (
+        isinstance(origin, QuerySet) and origin.model is OrderItem
+    )
+    if not is_deleted_directly:
+        return
+    # Check the payment in the update itself instead of loading the order
+    is_not_paid = Exists(Order.objects.filter(pk=instance.order_id, is_paid=False))
+    if Product.objects.filter(is_not_paid).return_stock(
+        instance.product_id, instance.quantity
+    ):
+        invalidate_catalog("products", instance.product_id)
@@ -1,6 +1,20 @@
 from celery import shared_task
 from django.core.management import call_command
+from . import services
 
 @shared_task
 def delete_unpaid_orders():
     call_command('delete_unpaid_orders')
+
+
+@shared_task
+def process_payment_events(batch_size=100):
+    """Process stored payment notifications batch by batch"""
+    taken = 0
+    while True:
+        count = services.process_payment_events(batch_size)
+        taken += count
+        # Waiting events are postponed, so a short batch means the queue
+        # is drained until they are due
+        if count < batch_size:
+            return taken
@@ -0,0 +1,198 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from product.models import Category, Product
+from .models import Order, OrderItem, Payment, PaymentEvent
+from .services import PAYMENT_EVENT_WAIT, checkout, process_payment_events
+
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+@override_settings(CACHES=NO_CACHE)
+class ConcurrentOrderStockTests(TransactionTestCase):
+    """
+    Orders placed from many threads never oversell a product.
+    Every thread holds its own connection, so the orders really compete
+    for the product rows in the database.
+    """
+
+    stock = 20
+    orders = 90
+    workers = 10
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="buyer@example.com", password="password"
+        )
+        category = Category.objects.create(name="Phones")
+        self.products = [
+            Product.objects.create(
+                category=category,
+                name=f"Phone {number}",
+                qty_in_stock=self.stock,
+                price=Decimal("100.00"),
+            )
+            for number in range(3)
+        ]
+
+    def place_orders(self, place_order, items):
+        """Place orders of random products from threads, get the placed count"""
+        # Products of every order are picked upfront, so runs are repeatable
+        rng = random.Random(0)
+        orders = [
+            {product.pk: 1 for product in rng.sample(self.products, items)}
+            for _ in range(self.orders)
+        ]
+
+        def run(quantities):
+            try:
+                place_order(quantities)
+                return True
+            except ValidationError:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return sum(executor.map(run, orders))
+
+    def assert_stock(self, placed):
+        """Stock left matches the quantities of the placed orders"""
+        self.assertEqual(Order.objects.count(), placed)
+        reserved = dict(
+            OrderItem.objects.order_by()
+            .values_list("product_id")
+            .annotate(quantity=Sum("quantity"))
+        )
+        for product in Product.objects.order_by("pk"):
+            with self.subTest(product.name):
+                self.assertGreaterEqual(product.qty_in_stock, 0)
+                self.assertEqual(
+                    product.qty_in_stock,
+                    self.stock - reserved.get(product.pk, 0),
+                )
+
+    def test_checkout(self):
+        # Several products per order in random order also catch deadlocks
+        placed = self.place_orders(
+            lambda quantities: checkout(self.user, quantities=quantities), items=2
+        )
+        # Demand exceeds the stock, some orders must be rejected
+        self.assertLess(placed, self.orders)
+        self.assert_stock(placed)
+
+    def test_order_item_signals(self):
+        def place_order(quantities):
+            with transaction.atomic():
+                order = Order.objects.create(user=self.user)
+                for product_id, quantity in quantities.items():
+                    OrderItem.objects.create(
+                        order=order, product_id=product_id, quantity=quantity
+                    )
+
+        placed = self.place_orders(place_order, items=1)
+        # Every product is ordered more times than it is in stock
+        self.assertEqual(placed, self.stock * len(self.products))
+        self.assert_stock(placed)
+
+
+class PaymentEventTests(TestCase):
+    """Stored payment notifications are applied once and in order"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email="buyer@example.com", password="password"
+        )
+        self.order = Order.objects.create(user=user, total=Decimal("100.00"))
+        self.payment = Payment.objects.create(
+            order=self.order, amount=self.order.total
+        )
+
+    def notify(self, event, order_id=None, payment_id="payment-1"):
+        """Post a notification to the webhook from a YooKassa address"""
+        data = {
+            "event": event,
+            "object": {
+                "id": payment_id,
+                "metadata": {"order_id": str(order_id or self.order.pk)},
+                "payment_method": {"type": "bank_card"},
+            },
+        }
+        response = APIClient().post(
+            reverse("order:yookassa-webhooks"),
+            data,
+            format="json",
+            REMOTE_ADDR="185.71.76.1",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def assert_payment(self, status, is_paid):
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.payment.status, status)
+        self.assertEqual(self.order.is_paid, is_paid)
+
+    def test_redelivered_notification(self):
+        self.notify("payment.succeeded")
+        self.notify("payment.succeeded")
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+        self.assertEqual(process_payment_events(), 1)
+        self.assert_payment(Payment.SUCCEEDED, is_paid=True)
+        self.assertEqual(process_payment_events(), 0)
+
+    def test_events_applied_in_order(self):
+        # Final statuses are not changed by later notifications
+        self.notify("payment.canceled")
+        self.notify("payment.succeeded")
+        self.assertEqual(process_payment_events(), 2)
+        self.assert_payment(Payment.CANCELED, is_paid=False)
+        self.assertFalse(PaymentEvent.objects.filter(processed_at=None).exists())
+
+    def test_event_without_order_id(self):
+        PaymentEvent.objects.create(
+            event_id="payment.succeeded:payment-0",
+            event="payment.succeeded",
+            payload={"event": "payment.succeeded", "object": {"id": "payment-0"}},
+        )
+        self.assertEqual(process_payment_events(), 1)
+        self.assertFalse(PaymentEvent.objects.filter(processed_at=None).exists())
+
+    def test_waiting_event(self):
+        # Notification of an order whose payment is not saved yet
+        other_order = Order.objects.create(user=self.order.user)
+        self.notify("payment.succeeded", order_id=other_order.pk, payment_id="early")
+        self.notify("payment.succeeded")
+
+        # The waiting event is postponed and doesn't hold up the next one
+        self.assertEqual(process_payment_events(batch_size=1), 1)
+        self.assertEqual(process_payment_events(batch_size=1), 1)
+        self.assert_payment(Payment.SUCCEEDED, is_paid=True)
+        self.assertEqual(process_payment_events(), 0)
+        waiting = PaymentEvent.objects.get(processed_at=None)
+        self.assertGreater(waiting.next_attempt_at, timezone.now())
+
+        # Applied once the payment is saved and the retry is due
+        other_payment = Payment.objects.create(order=other_order)
+        PaymentEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_payment_events(), 1)
+        other_payment.refresh_from_db()
+        self.assertEqual(other_payment.status, Payment.SUCCEEDED)
+
+    def test_expired_waiting_event(self):
+        self.notify("payment.succeeded", order_id=self.order.pk + 1)
+        PaymentEvent.objects.update(
+            created_at=timezone.now() - PAYMENT_EVENT_WAIT,
+            next_attempt_at=timezone.now(),
+        )
+        # Dropped once its payment didn't show up in time
+        self.assertEqual(process_payment_events(), 1)
+        self.assertFalse(PaymentEvent.objects.filter(processed_at=None).exists())
@@ -1,8 +1,7 @@
-import uuid, yookassa
+import uuid
+from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
-from django.conf import settings
-from django.shortcuts import get_object_or_404
 from rest_framework import filters
 from rest_framework.mixins import (
     CreateModelMixin,
@@ -14,13 +13,24 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.generics import CreateAPIView
 from rest_framework.viewsets import GenericViewSet
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
-from .models import Order, Payment
+from core.views import AsyncAPIViewMixin
+from user.authentication import CachedTokenAuthentication
+from user.carts import get_cart_store
+from user.context import get_user_context
+from .gateway import (
+    build_payment_payload,
+    get_async_payment_gateway,
+    get_payment_gateway,
+)
+from .models import Order, Payment, PaymentEvent
+from .services import checkout
+from .tasks import process_payment_events
 from .serializers import (
     OrderSerializer,
     YookassaPaymentRequestSerializer,
     YookassaPaymentResponseSerializer,
+    YookassaNotificationSerializer,
 )
 from .permissions import (
     DoesUserHaveAddress,
@@ -30,11 +40,6 @@ from .permissions import (
 )
 
 
-# Set Yookassa credentials
-yookassa.Configuration.account_id = settings.YOOKASSA_ACCOUNT_ID
-yookassa.Configuration.secret_key = settings.YOOKASSA_SECRET_KEY
-
-
 class OrderViewSet(
     CreateModelMixin,
     ListModelMixin,
@@ -45,7 +50,7 @@ class OrderViewSet(
     """Manage CRD ops on order"""
 
     permission_classes = [IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -71,19 +76,23 @@ class OrderViewSet(
 
     def perform_create(self, serializer):
         user = self.request.user
-        # Set default values for order
-        return serializer.save(
-            user=user,
-            shipping_address=user.shipping_address,
-            total=user.cart.get_total_amount(),
+        # Address and cart are already loaded by the permissions
+        context = get_user_context(self.request)
+        cart_store = get_cart_store()
+        # Write the cart behind before turning it into the order
+        cart_store.flush(user.pk)
+        # Create the order with its items from the user's cart
+        serializer.instance = checkout(
+            user, context.shipping_address, context.cart_quantities
         )
+        cart_store.clear(user.pk)
 
 
 class PaymentCreateView(APIView):
     """Create Yookassa payment object and Payment model instance"""
 
     permission_classes = [IsAuthenticated, IsOrderNotPaid]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     serializer_class = YookassaPaymentRequestSerializer
 
     @extend_schema(
@@ -94,60 +103,76 @@ class PaymentCreateView(APIView):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         return_url = serializer.validated_data.get("return_url")
-        # Limit orders to this user so the user can pay only for his orders
-        user_orders = Order.objects.filter(user=request.user)
-        order = get_object_or_404(user_orders, pk=order_pk)
-        # Create Yookassa payment object
-        payment = yookassa.Payment.create(
-            {
-                # TODO: include commission to amount
-                "amount": {
-                    "value": order.total,
-                    "currency": "RUB",
-                },
-                "confirmation": {
-                    "type": "redirect",
-                    "return_url": return_url,
-                },
-                "capture": True,
-                "description": f"Оплата заказа №{order.id} для {order.user.email}",
-                "metadata": {"order_id": order.id},
-            },
-            uuid.uuid4(),
+        # Only this user's orders, already fetched by `IsOrderNotPaid`
+        order = get_user_context(request).get_order(order_pk)
+        # Create Yookassa payment object, bounded by the gateway deadline
+        payment = get_payment_gateway().create_payment(
+            build_payment_payload(order, return_url), uuid.uuid4()
         )
 
         yookassa_confirmation_url = YookassaPaymentResponseSerializer(
-            payment.confirmation
+            payment["confirmation"]
         ).data
 
         # Delete existing pending payment for the order, if present
-        if Payment.objects.filter(order=order):
-            Payment.objects.filter(order=order).delete()
+        Payment.objects.filter(order=order).delete()
         # Create Payment model instance
         Payment.objects.create(order=order, amount=order.total)
         return Response(yookassa_confirmation_url, status=201)
 
 
+@extend_schema(exclude=True)
+class AsyncPaymentCreateView(AsyncAPIViewMixin, PaymentCreateView):
+    """
+    Create Yookassa payment object and Payment model instance,
+    the worker serves other requests while the gateway answers
+    """
+
+    async def post(self, request, order_pk):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return_url = serializer.validated_data.get("return_url")
+        # Only this user's orders, already fetched by `IsOrderNotPaid`
+        order = await get_user_context(request).aget_order(order_pk)
+        payment = await get_async_payment_gateway().create_payment(
+            build_payment_payload(order, return_url), uuid.uuid4()
+        )
+
+        yookassa_confirmation_url = YookassaPaymentResponseSerializer(
+            payment["confirmation"]
+        ).data
+
+        # Replace existing pending payment for the order, if present
+        await Payment.objects.filter(order=order).adelete()
+        await Payment.objects.acreate(order=order, amount=order.total)
+        return Response(yookassa_confirmation_url, status=201)
+
+
 class YookassaWebhookView(APIView):
-    """Modify order and payment based on the payment status"""
+    """
+    Store payment notifications and acknowledge them at once,
+    they are processed in background by `process_payment_events`
+    """
 
     permission_classes = [IsAllowedIP]
+    serializer_class = YookassaNotificationSerializer
 
     def post(self, request):
-        order_id = request.data["object"]["metadata"]["order_id"]
-        order = get_object_or_404(Order, pk=order_id)
-        payment = get_object_or_404(Payment, order=order)
-
-        # Mark payment and order as succeeded if payment succeeded
-        if request.data["event"] == "payment.succeeded":
-            payment.status = payment.SUCCEEDED
-            payment.payment_method = request.data["object"]["payment_method"]["type"]
-            order.is_paid = True
-        # Mark payment  as canceled if payment canceled
-        elif request.data["event"] == "payment.canceled":
-            payment.status = payment.CANCELED
-
-        payment.save()
-        order.save()
-
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        event = serializer.validated_data["event"]
+        payment_id = serializer.validated_data["object"]["id"]
+
+        # Redelivered notifications are acknowledged without storing twice
+        PaymentEvent.objects.bulk_create(
+            [
+                PaymentEvent(
+                    event_id=f"{event}:{payment_id}",
+                    event=event,
+                    payload=request.data,
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        transaction.on_commit(process_payment_events.delay)
         return Response(status=200)
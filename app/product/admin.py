@@ -4,13 +4,20 @@ from .models import Category, Product, ProductImage, ProductDiscount, Review
 
 class ProductAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "price", "get_final_price", "qty_in_stock", "rating")
+    search_fields = ("sku",)
 
-    # Calculate dynamic field `get_final_price`
+    # Calculate final prices in SQL for the whole page
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_final_price()
+
+    # Get dynamic field `get_final_price` from the annotation
     def get_final_price(self, obj):
-        return obj.calculate_final_price()
+        return obj.final_price
 
     # Set verbose name for dynamic field `get_final_price`
+    # and allow sorting by it
     get_final_price.short_description = "Итоговая цена"
+    get_final_price.admin_order_field = "final_price"
 
 
 admin.site.register(Category)
@@ -0,0 +1,31 @@
+from django.urls import path
+from .views import (
+    AsyncCategoryListView,
+    AsyncCategoryDetailView,
+    AsyncProductListView,
+    AsyncProductDetailView,
+    AsyncReviewListView,
+)
+
+# Async views of the hot catalog reads, served under ASGI
+app_name = "product-async"
+
+urlpatterns = [
+    path("categories/", AsyncCategoryListView.as_view(), name="category-list"),
+    path(
+        "categories/<int:pk>/",
+        AsyncCategoryDetailView.as_view(),
+        name="category-detail",
+    ),
+    path("products/", AsyncProductListView.as_view(), name="product-list"),
+    path(
+        "products/<int:pk>/",
+        AsyncProductDetailView.as_view(),
+        name="product-detail",
+    ),
+    path(
+        "products/<int:product_pk>/reviews/",
+        AsyncReviewListView.as_view(),
+        name="review-list",
+    ),
+]
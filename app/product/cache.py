@@ -0,0 +1,166 @@
+import hashlib
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+from core import metrics
+
+CACHE_PREFIX = "catalog"
+CACHE_RESOURCES = ("categories", "products", "discounts")
+
+
+def _generation_key(resource, scope):
+    return f"{CACHE_PREFIX}:{resource}:generation:{scope}"
+
+
+def _stats_key(resource, outcome):
+    return f"{CACHE_PREFIX}:{resource}:stats:{outcome}"
+
+
+def _get_generations(resource, scope):
+    """
+    Get the generations of the whole resource and of the scope.
+    Cached responses are keyed by them, so changing a generation
+    invalidates every response built under the previous one.
+    """
+    keys = [_generation_key(resource, "all"), _generation_key(resource, scope)]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Start a unique generation, so responses cached before
+            # the key was evicted are never served again
+            cache.add(key, time.time_ns(), timeout=None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def _get_cached_data(resource, scope, request):
+    """Get the response cache key and the cached data, `None` on a miss"""
+    generations = _get_generations(resource, scope)
+    url_hash = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    key = ":".join([CACHE_PREFIX, resource, scope, *map(str, generations), url_hash])
+
+    data = cache.get(key)
+    record_cache_access(resource, is_hit=data is not None)
+    return key, data
+
+
+def _invalidate(resource, pk=None):
+    if pk is None:
+        scopes = ["all"]
+    else:
+        # Object detail and every list where the object may appear
+        scopes = [f"object:{pk}", "list"]
+
+    generation = time.time_ns()
+    cache.set_many(
+        {_generation_key(resource, scope): generation for scope in scopes},
+        timeout=None,
+    )
+
+
+def invalidate_catalog(resource, pk=None):
+    """
+    Invalidate cached responses of the catalog resource once the current
+    transaction commits. With `pk` only the object's detail and the lists
+    are invalidated, otherwise every response of the resource.
+    """
+    transaction.on_commit(lambda: _invalidate(resource, pk))
+
+
+def record_cache_access(resource, is_hit):
+    """Count cache hits and misses of the resource"""
+    metrics.record_cache_access(f"{CACHE_PREFIX}:{resource}", is_hit)
+    key = _stats_key(resource, "hits" if is_hit else "misses")
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The counter does not exist yet
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_cache_stats():
+    """Get cache hits and misses per catalog resource"""
+    keys = {
+        (resource, outcome): _stats_key(resource, outcome)
+        for resource in CACHE_RESOURCES
+        for outcome in ("hits", "misses")
+    }
+    counters = cache.get_many(keys.values())
+    return {
+        resource: {
+            outcome: counters.get(keys[resource, outcome], 0)
+            for outcome in ("hits", "misses")
+        }
+        for resource in CACHE_RESOURCES
+    }
+
+
+def reset_cache_stats():
+    cache.delete_many(
+        [
+            _stats_key(resource, outcome)
+            for resource in CACHE_RESOURCES
+            for outcome in ("hits", "misses")
+        ]
+    )
+
+
+class CachedResponseMixin:
+    """
+    Serve list and retrieve responses from the shared cache.
+    Responses are keyed by the full request URL.
+    """
+
+    # Name of the catalog resource used for invalidation
+    cache_resource = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response("list", super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = str(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        # Don't cache non canonical lookups like `007`, they could
+        # not be invalidated by the object's primary key
+        if not lookup.isdigit() or str(int(lookup)) != lookup:
+            return super().retrieve(request, *args, **kwargs)
+        return self.get_cached_response(
+            f"object:{lookup}", super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cached_response(self, scope, handler, request, *args, **kwargs):
+        key, data = _get_cached_data(self.cache_resource, scope, request)
+        if data is not None:
+            return Response(data)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        return response
+
+
+class AsyncCachedResponseMixin:
+    """
+    Async counterpart of `CachedResponseMixin` for async views,
+    `get_cached_response` awaits the handler and the cache
+    """
+
+    # Name of the catalog resource used for invalidation
+    cache_resource = None
+
+    async def get_cached_response(self, scope, handler, request, *args, **kwargs):
+        # The cache client is synchronous, look the response up
+        # in a single thread switch instead of one per cache call
+        key, data = await sync_to_async(_get_cached_data)(
+            self.cache_resource, scope, request
+        )
+        if data is not None:
+            return Response(data)
+
+        response = await handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            await cache.aset(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        return response
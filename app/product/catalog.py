@@ -0,0 +1,71 @@
+import csv
+import json
+import os
+
+# Columns of catalog import/export files. Category and discount
+# are referenced by their unique names
+CATALOG_FIELDS = (
+    "sku",
+    "name",
+    "category",
+    "brand",
+    "description",
+    "qty_in_stock",
+    "price",
+    "discount",
+    "properties",
+)
+CATALOG_FORMATS = ("csv", "jsonl")
+
+
+def guess_catalog_format(path):
+    """Guess catalog file format by the file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return None
+
+
+def read_catalog(file, file_format):
+    """Lazily read catalog rows as `(line_number, row)` pairs"""
+    if file_format == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            # Properties are stored as a JSON object inside CSV cell
+            properties = row.get("properties")
+            try:
+                row["properties"] = json.loads(properties) if properties else {}
+            except ValueError:
+                row["properties"] = properties
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row
+
+
+class CatalogWriter:
+    """Write catalog rows to CSV or JSONL file"""
+
+    def __init__(self, file, file_format):
+        self.file = file
+        self.file_format = file_format
+        if file_format == "csv":
+            self.writer = csv.writer(file)
+            self.writer.writerow(CATALOG_FIELDS)
+
+    def write(self, row):
+        row = dict(zip(CATALOG_FIELDS, row))
+        row["price"] = str(row["price"])
+        if self.file_format == "csv":
+            row["properties"] = json.dumps(row["properties"], ensure_ascii=False)
+            self.writer.writerow(row.values())
+        else:
+            self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
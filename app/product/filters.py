@@ -0,0 +1,124 @@
+import json
+import django_filters
+from django import forms
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
+from rest_framework.filters import SearchFilter
+from .models import SEARCH_CONFIG, Product
+
+
+class PropertyField(forms.Field):
+    """Form field for repeated `key:value` property pairs"""
+
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+
+        pairs = []
+        for item in value:
+            key, separator, property_value = item.partition(":")
+            if not separator or not key:
+                raise forms.ValidationError(
+                    f"Expected `key:value` property pair, got {item!r}"
+                )
+            pairs.append((key, property_value))
+        return pairs
+
+
+@extend_schema_field(OpenApiTypes.STR)
+class PropertyFilter(django_filters.Filter):
+    """
+    Filter products by `properties` pairs, e.g. `?prop=color:red&prop=ram:8`.
+    Values of the same key are OR-ed, different keys are AND-ed.
+    """
+
+    field_class = PropertyField
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+
+        values_by_key = {}
+        for key, property_value in value:
+            values_by_key.setdefault(key, []).append(property_value)
+
+        for key, property_values in values_by_key.items():
+            condition = Q()
+            for property_value in property_values:
+                # Containment lookups are served by the GIN index
+                condition |= Q(properties__contains={key: property_value})
+                # Also match JSON numbers and booleans, e.g. `ram:8`
+                parsed_value = self._parse(property_value)
+                if parsed_value is not None:
+                    condition |= Q(properties__contains={key: parsed_value})
+            qs = qs.filter(condition)
+        return qs
+
+    @staticmethod
+    def _parse(value):
+        try:
+            parsed_value = json.loads(value)
+        except ValueError:
+            return None
+        if isinstance(parsed_value, (bool, int, float)):
+            return parsed_value
+        return None
+
+
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    """Comma separated list of strings filter"""
+
+
+class ProductFilter(django_filters.FilterSet):
+    """Product filter set"""
+
+    brand = CharInFilter(field_name="brand", lookup_expr="in")
+    prop = PropertyFilter()
+    # Requires the queryset annotated by `with_final_price()`
+    final_price__gte = django_filters.NumberFilter(
+        field_name="final_price", lookup_expr="gte"
+    )
+    final_price__lte = django_filters.NumberFilter(
+        field_name="final_price", lookup_expr="lte"
+    )
+
+    class Meta:
+        model = Product
+        fields = {
+            "category": ["exact"],
+            "price": ["gte", "lte"],
+        }
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    Full-text product search over the weighted `search_vector` column
+    with a trigram fallback on the name for misspelled terms
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+
+        term = " ".join(search_terms)
+        query = SearchQuery(term, config=SEARCH_CONFIG, search_type="websearch")
+        # Relevance is `real` in PostgreSQL. Cast to double precision, so the
+        # values kept in keyset cursors compare equal to the boundary rows
+        queryset = queryset.annotate(
+            rank=Cast(SearchRank(F("search_vector"), query), FloatField()),
+            similarity=Cast(TrigramSimilarity("name", term), FloatField()),
+        ).filter(
+            # Both conditions are served by GIN indexes
+            Q(search_vector=query) | Q(name__trigram_similar=term)
+        )
+
+        # Order by relevance unless the client asked for another ordering
+        if not queryset.query.order_by:
+            queryset = queryset.order_by("-rank", "-similarity", "id")
+        return queryset
@@ -0,0 +1,68 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from product.models import Product
+from product.serializers import ProductSerializer, ProductValuesSerializer
+from product.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    """
+    Django command to compare product serialization through
+    `ProductSerializer` and `ProductValuesSerializer` on pages of products
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[100, 1000, 10000],
+            help="Page sizes to measure.",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        # Image URLs are built absolute as in API responses
+        context = {"request": APIRequestFactory().get("/api/products/")}
+        renderer = JSONRenderer()
+        queryset = ProductViewSet.queryset.order_by("id")
+        available = queryset.count()
+
+        for size in options["sizes"]:
+            if size > available:
+                self.stderr.write(f"Skip {size} rows, only {available} products.")
+                continue
+
+            def serialize_instances():
+                page = queryset.prefetch_related("images")[:size]
+                data = ProductSerializer(page, many=True, context=context).data
+                return renderer.render(data)
+
+            def serialize_values():
+                columns = ProductValuesSerializer.get_value_columns()
+                page = queryset.values(*columns)[:size]
+                data = ProductValuesSerializer(page, many=True, context=context).data
+                return renderer.render(data)
+
+            if serialize_instances() != serialize_values():
+                raise CommandError(f"Serializers disagree on {size} rows.")
+
+            instances = self.measure(serialize_instances, options["repeat"])
+            values = self.measure(serialize_values, options["repeat"])
+            self.stdout.write(
+                f"{size} rows: ProductSerializer {instances * 1000:.1f} ms, "
+                f"ProductValuesSerializer {values * 1000:.1f} ms "
+                f"({instances / values:.1f}x faster)"
+            )
+
+    @staticmethod
+    def measure(serialize, repeat):
+        """Get the best time of the serialization including its queries"""
+        timings = []
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            serialize()
+            timings.append(time.perf_counter() - started_at)
+        return min(timings)
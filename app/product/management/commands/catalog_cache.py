@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from product.cache import (
+    CACHE_RESOURCES,
+    get_cache_stats,
+    invalidate_catalog,
+    reset_cache_stats,
+)
+
+
+class Command(BaseCommand):
+    """Django command to show catalog cache hit ratios or drop the cache"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Invalidate every cached catalog response.",
+        )
+        parser.add_argument(
+            "--reset-stats",
+            action="store_true",
+            help="Reset hit and miss counters.",
+        )
+
+    def handle(self, *args, **options):
+        for resource, stats in get_cache_stats().items():
+            requests = stats["hits"] + stats["misses"]
+            ratio = stats["hits"] / requests if requests else 0
+            self.stdout.write(
+                f"{resource}: {stats['hits']} hits, {stats['misses']} misses "
+                f"({ratio:.1%} hit ratio)"
+            )
+
+        if options["reset_stats"]:
+            reset_cache_stats()
+            self.stdout.write("Cache stats are reset.")
+        if options["clear"]:
+            for resource in CACHE_RESOURCES:
+                invalidate_catalog(resource)
+            self.stdout.write(self.style.SUCCESS("Catalog cache is cleared."))
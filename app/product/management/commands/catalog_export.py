@@ -0,0 +1,67 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from product.models import Product
+from product.catalog import CATALOG_FORMATS, CatalogWriter, guess_catalog_format
+
+
+class Command(BaseCommand):
+    """
+    Django command to export products to a CSV or JSONL file.
+    Rows are streamed from a server-side cursor, so memory use is bounded.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to export to, `-` for stdout.")
+        parser.add_argument("--format", choices=CATALOG_FORMATS)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or guess_catalog_format(path)
+        if not file_format:
+            raise CommandError("Cannot guess the file format, use --format.")
+
+        if path == "-":
+            self.export(sys.stdout, file_format, options["chunk_size"])
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as file:
+                self.export(file, file_format, options["chunk_size"])
+
+    def export(self, file, file_format, chunk_size):
+        rows = (
+            Product.objects.order_by("pk")
+            .values_list(
+                "sku",
+                "name",
+                "category__name",
+                "brand",
+                "description",
+                "qty_in_stock",
+                "price",
+                "discount__name",
+                "properties",
+            )
+            .iterator(chunk_size=chunk_size)
+        )
+
+        writer = CatalogWriter(file, file_format)
+        started_at = time.monotonic()
+        exported = 0
+        for row in rows:
+            writer.write(row)
+            exported += 1
+            if exported % chunk_size == 0:
+                elapsed = time.monotonic() - started_at
+                # Report to stderr, stdout may be the exported file
+                self.stderr.write(
+                    f"{exported} products exported ({exported / elapsed:.0f} rows/s)"
+                )
+
+        elapsed = time.monotonic() - started_at
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"Exported {exported} products in {elapsed:.1f}s "
+                f"({exported / max(elapsed, 1e-9):.0f} rows/s)."
+            )
+        )
@@ -0,0 +1,199 @@
+import sys
+import time
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from product.models import Category, Product, ProductDiscount
+from product.cache import invalidate_catalog
+from product.catalog import CATALOG_FORMATS, guess_catalog_format, read_catalog
+
+# Product fields set from file rows and checked by the field validators
+VALIDATED_FIELDS = {
+    "sku",
+    "name",
+    "description",
+    "brand",
+    "qty_in_stock",
+    "properties",
+    "price",
+}
+
+
+class Command(BaseCommand):
+    """
+    Django command to upsert products by SKU from a CSV or JSONL file.
+    The file is streamed and written in batches, so memory use is bounded.
+    """
+
+    # Fields updated when a product with the same SKU already exists
+    update_fields = [
+        "category",
+        "name",
+        "description",
+        "brand",
+        "qty_in_stock",
+        "properties",
+        "price",
+        "discount",
+        "updated_at",
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, `-` for stdin.")
+        parser.add_argument("--format", choices=CATALOG_FORMATS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--create-categories",
+            action="store_true",
+            help="Create categories missing in the database instead of "
+            "rejecting their rows.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or guess_catalog_format(path)
+        if not file_format:
+            raise CommandError("Cannot guess the file format, use --format.")
+
+        self.batch_size = options["batch_size"]
+        self.create_categories = options["create_categories"]
+        # Resolve references from memory instead of a query per row
+        self.categories = dict(Category.objects.values_list("name", "id"))
+        self.discounts = dict(ProductDiscount.objects.values_list("name", "id"))
+        self.unvalidated_fields = [
+            field.name
+            for field in Product._meta.fields
+            if field.name not in VALIDATED_FIELDS
+        ]
+        self.imported = self.rejected = 0
+        self.started_at = time.monotonic()
+
+        if path == "-":
+            self.import_rows(read_catalog(sys.stdin, file_format))
+        else:
+            with open(path, newline="", encoding="utf-8") as file:
+                self.import_rows(read_catalog(file, file_format))
+
+        # Bulk writes don't send signals
+        invalidate_catalog("products")
+        invalidate_catalog("categories")
+
+        elapsed = time.monotonic() - self.started_at
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {self.imported} products, rejected {self.rejected} rows "
+                f"in {elapsed:.1f}s ({self.imported / max(elapsed, 1e-9):.0f} rows/s)."
+            )
+        )
+
+    def import_rows(self, rows):
+        batch = []
+        for line_number, row in rows:
+            batch.append((line_number, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+
+    def import_batch(self, batch):
+        if self.create_categories:
+            self.add_missing_categories(batch)
+
+        # Keep the last row of a duplicated SKU, a single upsert
+        # statement cannot update the same row twice
+        products = {}
+        for line_number, row in batch:
+            try:
+                product = self.build_product(row)
+            except ValidationError as error:
+                self.reject(line_number, error.messages)
+                continue
+            products[product.sku] = product
+
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                products.values(),
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=self.update_fields,
+            )
+
+        self.imported += len(products)
+        elapsed = time.monotonic() - self.started_at
+        self.stdout.write(
+            f"{self.imported} products imported "
+            f"({self.imported / max(elapsed, 1e-9):.0f} rows/s)"
+        )
+
+    def add_missing_categories(self, batch):
+        """Create categories of the batch missing in the database"""
+        names = {
+            row.get("category")
+            for _, row in batch
+            if isinstance(row, dict) and row.get("category")
+        }
+        missing = names - self.categories.keys()
+        if not missing:
+            return
+
+        Category.objects.bulk_create(
+            [Category(name=name) for name in missing], ignore_conflicts=True
+        )
+        self.categories.update(
+            Category.objects.filter(name__in=missing).values_list("name", "id")
+        )
+
+    def build_product(self, row):
+        """Build a validated unsaved product from the file row"""
+        if not isinstance(row, dict):
+            raise ValidationError("Row is not a JSON object.")
+
+        errors = []
+        sku = row.get("sku")
+        if not sku:
+            errors.append("sku: This field is required.")
+
+        category_id = self.categories.get(row.get("category"))
+        if category_id is None:
+            errors.append(f"category: Unknown category {row.get('category')!r}.")
+
+        discount_id = None
+        if row.get("discount"):
+            discount_id = self.discounts.get(row["discount"])
+            if discount_id is None:
+                errors.append(f"discount: Unknown discount {row['discount']!r}.")
+
+        properties = row.get("properties") or {}
+        if not isinstance(properties, dict):
+            errors.append("properties: Must be a JSON object.")
+
+        product = Product(
+            sku=sku,
+            category_id=category_id,
+            discount_id=discount_id,
+            name=row.get("name") or "",
+            brand=row.get("brand") or "",
+            description=row.get("description") or "",
+            qty_in_stock=row.get("qty_in_stock"),
+            price=row.get("price"),
+            properties=properties,
+        )
+        try:
+            # Run validators of imported fields in memory,
+            # references are resolved above
+            product.clean_fields(exclude=self.unvalidated_fields)
+        except ValidationError as error:
+            errors += [
+                f"{field}: {message}"
+                for field, messages in error.message_dict.items()
+                for message in messages
+            ]
+
+        if errors:
+            raise ValidationError(errors)
+        return product
+
+    def reject(self, line_number, messages):
+        self.rejected += 1
+        self.stderr.write(f"Line {line_number}: {' '.join(messages)}")
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:25
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['properties'], name='product_properties_idx', opclasses=['jsonb_path_ops']),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:28
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_review_aggregates(apps, schema_editor):
+    """Calculate review aggregates of products from existing reviews"""
+    Product = apps.get_model("product", "Product")
+    Review = apps.get_model("product", "Review")
+
+    star_counts = {
+        f"rating_{star}_count": Count("id", filter=Q(rating=star))
+        for star in range(1, 6)
+    }
+    aggregates = Review.objects.values("product").annotate(
+        review_count=Count("id"),
+        rating_sum=Sum("rating"),
+        **star_counts,
+    )
+    products = [Product(pk=row.pop("product"), **row) for row in aggregates]
+    Product.objects.bulk_update(
+        products,
+        ["review_count", "rating_sum", *star_counts],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_product_properties_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_review_aggregates, migrations.RunPython.noop),
+    ]
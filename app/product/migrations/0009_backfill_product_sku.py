@@ -0,0 +1,25 @@
+from django.db import migrations, models
+from django.db.models.functions import Cast, Concat
+
+
+def backfill_product_sku(apps, schema_editor):
+    """Give products without a stock keeping unit one derived from the id"""
+    Product = apps.get_model("product", "Product")
+    Product.objects.filter(sku__isnull=True).update(
+        sku=Concat(
+            models.Value("P-"),
+            Cast("id", models.CharField()),
+            output_field=models.CharField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_sku, migrations.RunPython.noop),
+    ]
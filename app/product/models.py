@@ -1,7 +1,12 @@
 import os
 from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
 from uuid import uuid4
-from django.db import models
+from django.db import connections, models
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, Now, NullIf, Round, TruncDate
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
@@ -14,6 +19,11 @@ def generate_product_image_path(instance, filename):
     return os.path.join("uploads", "product", filename)
 
 
+# Text search configuration for the product search vector. `russian` stems
+# cyrillic words and falls back to english stemming for latin ones
+SEARCH_CONFIG = "russian"
+
+
 def validate_unique_keys(value):
     """Check if product property keys are unique"""
     keys = [k.lower() for k in value]
@@ -22,6 +32,138 @@ def validate_unique_keys(value):
         raise ValidationError(f"Property key duplication: {duplicating_keys}")
 
 
+def final_price_expression(prefix=""):
+    """
+    Build SQL counterpart of `Product.calculate_final_price()`.
+    `prefix` is a lookup path to the product, e.g. `product__`
+    """
+    # Take the date in the database, so querysets built once, e.g. class
+    # attributes of views, don't keep the discount window of their first day
+    today = TruncDate(Now())
+    price = F(f"{prefix}price")
+    discount_percent = F(f"{prefix}discount__discount_percent")
+    is_discount_current = Q(
+        **{
+            f"{prefix}discount__is_active": True,
+            f"{prefix}discount__start_date__lte": today,
+            f"{prefix}discount__end_date__gt": today,
+        }
+    )
+    return Case(
+        When(
+            is_discount_current,
+            then=Round(price - (price / 100) * discount_percent, 2),
+        ),
+        default=price,
+        output_field=models.DecimalField(max_digits=8, decimal_places=2),
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    """Product queryset"""
+
+    def with_final_price(self):
+        """Annotate products with the price after discount as `final_price`"""
+        return self.annotate(final_price=final_price_expression())
+
+    def update_rating(self, added=None, removed=None):
+        """
+        Atomically apply added and/or removed review rating
+        to the products' review aggregates and average rating
+        """
+        count_delta = (added is not None) - (removed is not None)
+        sum_delta = (added or 0) - (removed or 0)
+        review_count = F("review_count") + count_delta
+        rating_sum = F("rating_sum") + sum_delta
+
+        star_counts = {}
+        for star, delta in ((added, 1), (removed, -1)):
+            if star is not None:
+                field = f"rating_{star}_count"
+                star_counts[field] = star_counts.get(field, F(field)) + delta
+
+        return self.update(
+            review_count=review_count,
+            rating_sum=rating_sum,
+            # Expressions refer to the values before update
+            rating=Coalesce(
+                Cast(rating_sum, FloatField()) / NullIf(review_count, 0),
+                Value(0.0),
+            ),
+            **star_counts,
+        )
+
+    def take_stock(self, product_id, quantity):
+        """
+        Atomically take the quantity of the product from stock
+        in one conditional update. Return `False` on shortfall,
+        the stock is left untouched then.
+        """
+        return bool(
+            self.filter(pk=product_id, qty_in_stock__gte=quantity).update(
+                qty_in_stock=F("qty_in_stock") - quantity
+            )
+        )
+
+    def take_stock_bulk(self, quantities):
+        """
+        Take quantities of several products from stock in one update,
+        e.g. `{product_id: quantity}`. Stock must be validated beforehand
+        with the products locked.
+        """
+        return self._change_stock_bulk(
+            {product_id: -quantity for product_id, quantity in quantities.items()}
+        )
+
+    def return_stock_bulk(self, quantities):
+        """Return quantities of several products to stock in one update"""
+        return self._change_stock_bulk(quantities)
+
+    def _change_stock_bulk(self, deltas):
+        return self.filter(pk__in=deltas).update(
+            qty_in_stock=Case(
+                *[
+                    When(pk=product_id, then=F("qty_in_stock") + delta)
+                    for product_id, delta in deltas.items()
+                ],
+                default=F("qty_in_stock"),
+            )
+        )
+
+    def return_stock(self, product_id, quantity):
+        """Atomically return the quantity of the product to stock"""
+        return self.filter(pk=product_id).update(
+            qty_in_stock=F("qty_in_stock") + quantity
+        )
+
+    def property_facets(self):
+        """
+        Count products per property value in one grouped query,
+        e.g. `{"color": {"red": 10, "blue": 3}}`
+        """
+        products, params = self.order_by().values("pk").query.sql_with_params()
+        sql = f"""
+            SELECT property.key, property.value, COUNT(*)
+            FROM {self.model._meta.db_table} AS product
+            CROSS JOIN LATERAL jsonb_each_text(
+                CASE jsonb_typeof(product.properties)
+                    WHEN 'object' THEN product.properties ELSE '{{}}'::jsonb
+                END
+            ) AS property
+            WHERE product.id IN ({products})
+            GROUP BY property.key, property.value
+            ORDER BY property.key, COUNT(*) DESC, property.value
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        facets = {}
+        for key, value, count in rows:
+            facets.setdefault(key, {})[value] = count
+        return facets
+
+
 class Category(models.Model):
     """Product's category model"""
 
@@ -38,6 +180,8 @@ class Product(models.Model):
     """Product model"""
 
     category = models.ForeignKey(to=Category, on_delete=models.CASCADE)
+    # Stock keeping unit, natural key for catalog import
+    sku = models.CharField(max_length=64, unique=True, blank=True, null=True)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     brand = models.CharField(max_length=100, blank=True)
@@ -57,6 +201,14 @@ class Product(models.Model):
         default=0,
         validators=[MinValueValidator(0), MaxValueValidator(5)],
     )
+    # Review aggregates maintained by review signals
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
     price = models.DecimalField(
         max_digits=8,
         decimal_places=2,
@@ -68,18 +220,65 @@ class Product(models.Model):
         blank=True,
         null=True,
     )
+    # Weighted full-text document maintained by the database itself
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector("name", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("brand", weight="B", config=SEARCH_CONFIG)
+            + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+            + SearchVector("properties", weight="D", config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            # Serves `properties @> {...}` containment filters
+            GinIndex(
+                fields=["properties"],
+                name="product_properties_idx",
+                opclasses=["jsonb_path_ops"],
+            ),
+            # Trigram index for misspelled product name search
+            GinIndex(
+                fields=["name"],
+                name="product_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            # Keyset pagination indexes for the ordering fields
+            models.Index(
+                fields=["created_at", "id"], name="product_created_at_id_idx"
+            ),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["rating", "id"], name="product_rating_id_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
+    @property
+    def rating_histogram(self):
+        """Number of reviews per star"""
+        return {
+            str(star): getattr(self, f"rating_{star}_count") for star in range(1, 6)
+        }
+
     def calculate_final_price(self):
         """Get the price after discount"""
         if self.discount and self.discount.is_current():
             discount_amount = (self.price / 100) * self.discount.discount_percent
-            return round((self.price - discount_amount), 2)
+            # Round half up the same way as PostgreSQL does in
+            # `final_price_expression()`
+            return (self.price - discount_amount).quantize(
+                Decimal("0.01"), rounding=ROUND_HALF_UP
+            )
 
         return self.price
 
@@ -97,6 +296,8 @@ class ProductImage(models.Model):
         blank=True,
         null=True,
     )
+    # Metadata of resized image variants created in background
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -150,3 +351,10 @@ class Review(models.Model):
                 fields=["user", "product"], name="unique_user_product_review"
             )
         ]
+        indexes = [
+            # Keyset pagination index for the default review ordering
+            models.Index(
+                fields=["product", "updated_at", "id"],
+                name="review_product_updated_id_idx",
+            ),
+        ]
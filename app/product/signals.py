@@ -1,22 +1,98 @@
+from django.db import transaction
 from django.dispatch import receiver
-from django.db.models import Avg
-from django.db.models.signals import post_save, post_delete
-from .models import Review
+from django.db.models.signals import pre_save, post_save, post_delete
+from .models import Category, Product, ProductImage, ProductDiscount, Review
+from .cache import invalidate_catalog
+from core.images import has_stale_variants
+from core.tasks import create_image_variants
 
 
-@receiver([post_save, post_delete], sender=Review)
-def update_product_rating(sender, instance, **kwargs):
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Remember the stored rating of an edited review"""
+    instance._previous_rating = None
+    if not instance._state.adding:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk)
+            .values_list("rating", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def add_review_rating(sender, instance, created, **kwargs):
     """
-    Update the product rating whenever a review for it saved or deleted
+    Update the product rating aggregates whenever a review
+    for it is created or its rating is changed
     """
-    product = instance.product
-    reviews = product.reviews.all()
-
-    if reviews:
-        avg_rating_dict = reviews.aggregate(Avg("rating"))
-        avg_rating = avg_rating_dict["rating__avg"]
-        product.rating = avg_rating
+    previous_rating = getattr(instance, "_previous_rating", None)
+    if created:
+        changes = {"added": instance.rating}
+    elif previous_rating is not None and previous_rating != instance.rating:
+        changes = {"added": instance.rating, "removed": previous_rating}
     else:
-        product.rating = 0
+        return
+
+    Product.objects.filter(pk=instance.product_id).update_rating(**changes)
+    # Queryset update doesn't send product signals
+    invalidate_catalog("products", instance.product_id)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    """Update the product rating aggregates whenever a review for it deleted"""
+    Product.objects.filter(pk=instance.product_id).update_rating(
+        removed=instance.rating
+    )
+    invalidate_catalog("products", instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+def assign_default_sku(sender, instance, created, **kwargs):
+    """
+    Derive the stock keeping unit of a product created without one
+    from its id, like the backfill migration does, so every product
+    can be exported and imported back
+    """
+    if created and not instance.sku:
+        instance.sku = f"P-{instance.pk}"
+        Product.objects.filter(pk=instance.pk).update(sku=instance.sku)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """Drop cached responses with the changed product"""
+    invalidate_catalog("products", instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def invalidate_product_image_cache(sender, instance, **kwargs):
+    """Drop cached responses with the product of the changed image"""
+    invalidate_catalog("products", instance.product_id)
+
+
+@receiver([post_save, post_delete], sender=ProductDiscount)
+def invalidate_discount_cache(sender, instance, **kwargs):
+    """
+    Drop cached responses with the changed discount and all products,
+    as their final prices may depend on it
+    """
+    invalidate_catalog("discounts", instance.pk)
+    invalidate_catalog("products")
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """Drop cached responses with the changed category"""
+    invalidate_catalog("categories", instance.pk)
+
 
-    product.save()
+@receiver(post_save, sender=ProductImage)
+def create_product_image_variants(sender, instance, **kwargs):
+    """Create resized variants of the uploaded product image in background"""
+    if has_stale_variants(instance, "image"):
+        transaction.on_commit(
+            lambda: create_image_variants.delay(
+                "product.ProductImage", instance.pk, "image"
+            )
+        )
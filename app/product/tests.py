@@ -0,0 +1,204 @@
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from .models import Category, Product, ProductDiscount, ProductImage
+
+# Responses must come from the database, not from the catalog cache
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+@override_settings(CACHES=NO_CACHE)
+class ProductQueryCountTests(TestCase):
+    """Product endpoints run a fixed number of queries whatever the page size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones")
+        discount = ProductDiscount.objects.create(
+            name="Sale",
+            discount_percent=Decimal("10.0"),
+            end_date=date.today() + timedelta(days=7),
+        )
+        products = Product.objects.bulk_create(
+            Product(
+                category=category,
+                name=f"Phone {number}",
+                qty_in_stock=10,
+                price=Decimal("100.00") + number,
+                discount=discount if number % 2 else None,
+            )
+            for number in range(30)
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(product=product, image=f"uploads/product/{number}.jpg")
+            for product in products
+            for number in range(2)
+        )
+        cls.product = products[0]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assert_list_queries(self, num):
+        url = reverse("product:product-list")
+        for limit in (5, 30):
+            with self.subTest(limit=limit), self.assertNumQueries(num):
+                response = self.client.get(url, {"limit": limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data["results"]), limit)
+
+    def test_list(self):
+        # Count, page and prefetched images
+        self.assert_list_queries(3)
+
+    @override_settings(CATALOG_FAST_SERIALIZER=False)
+    def test_list_of_instances(self):
+        self.assert_list_queries(3)
+
+    def test_fast_serializer_output(self):
+        # Rows and instances give the same output for every fieldset.
+        # Products are created at the same time, order them by price
+        url = reverse("product:product-list")
+        fieldsets = {
+            "all": {},
+            "sparse": {"fields": "id,name,price,rating_histogram,images"},
+            "omitted": {"omit": "description,images"},
+            "empty": {"fields": ""},
+        }
+        for name, params in fieldsets.items():
+            with self.subTest(name):
+                responses = []
+                for fast in (True, False):
+                    with self.settings(CATALOG_FAST_SERIALIZER=fast):
+                        response = self.client.get(
+                            url, {"limit": 10, "ordering": "price", **params}
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    responses.append(response.json())
+                self.assertEqual(responses[0], responses[1])
+                self.assertEqual(len(responses[0]["results"]), 10)
+        self.assertEqual(responses[0]["results"][0], {})
+
+    def test_retrieve(self):
+        url = reverse("product:product-detail", args=[self.product.pk])
+        # Product with its final price and prefetched images
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["images"]), 2)
+
+
+class FinalPriceTests(TestCase):
+    """SQL final price agrees with `Product.calculate_final_price()`"""
+
+    def test_discount_window(self):
+        category = Category.objects.create(name="Phones")
+        today = date.today()
+        discounts = {
+            "current": {"end_date": today + timedelta(days=1)},
+            "ending today": {"end_date": today},
+            "starting today": {
+                "start_date": today,
+                "end_date": today + timedelta(days=1),
+            },
+            "future": {
+                "start_date": today + timedelta(days=1),
+                "end_date": today + timedelta(days=2),
+            },
+            "inactive": {"end_date": today + timedelta(days=1), "is_active": False},
+        }
+        for name, fields in discounts.items():
+            discount = ProductDiscount.objects.create(
+                name=name, discount_percent=Decimal("12.5"), **fields
+            )
+            Product.objects.create(
+                category=category,
+                name=name,
+                qty_in_stock=1,
+                price=Decimal("99.99"),
+                discount=discount,
+            )
+
+        for product in Product.objects.with_final_price().select_related("discount"):
+            with self.subTest(product.name):
+                self.assertEqual(product.final_price, product.calculate_final_price())
+
+    def test_date_is_not_frozen(self):
+        # Querysets built at import keep working after midnight
+        sql = str(Product.objects.with_final_price().query)
+        self.assertNotIn(date.today().isoformat(), sql)
+
+
+@override_settings(CACHES=NO_CACHE)
+class ProductSearchPaginationTests(TestCase):
+    """Keyset pagination walks search results ordered by relevance"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones")
+        Product.objects.bulk_create(
+            Product(
+                category=category,
+                name=f"Acme phone {'Pro ' * (number % 4)}{number}",
+                brand="Acme" if number % 3 else "",
+                description="Acme camera " * (number % 5),
+                qty_in_stock=10,
+                price=Decimal("100.00") + number,
+            )
+            for number in range(30)
+        )
+
+    def test_cursor_walks_all_pages(self):
+        client = APIClient()
+        url = reverse("product:product-list")
+        response = client.get(url, {"search": "Acme", "cursor": "", "limit": 7})
+        seen = []
+        for _ in range(10):
+            self.assertEqual(response.status_code, 200)
+            seen += [product["id"] for product in response.data["results"]]
+            if response.data["next"] is None:
+                break
+            response = client.get(response.data["next"])
+        else:
+            self.fail("Cursor pagination doesn't reach the last page")
+
+        self.assertEqual(len(seen), 30)
+        self.assertEqual(set(seen), set(Product.objects.values_list("id", flat=True)))
+
+
+class CatalogRoundTripTests(TestCase):
+    """Exported catalog is imported back without changes"""
+
+    def test_export_import(self):
+        category = Category.objects.create(name="Phones")
+        product = Product.objects.create(
+            category=category,
+            name="Phone",
+            qty_in_stock=3,
+            price=Decimal("100.00"),
+            properties={"ram": 8},
+        )
+        # Products created without a SKU get one derived from the id
+        self.assertEqual(product.sku, f"P-{product.pk}")
+        product.refresh_from_db()
+        self.assertEqual(product.sku, f"P-{product.pk}")
+
+        for file_format in ("csv", "jsonl"):
+            with self.subTest(file_format), tempfile.NamedTemporaryFile(
+                suffix=f".{file_format}"
+            ) as file:
+                call_command("catalog_export", file.name, stderr=StringIO())
+                output, errors = StringIO(), StringIO()
+                call_command("catalog_import", file.name, stdout=output, stderr=errors)
+
+                self.assertEqual(errors.getvalue(), "")
+                self.assertIn("Imported 1 products, rejected 0 rows", output.getvalue())
+                self.assertEqual(Product.objects.count(), 1)
+                imported = Product.objects.get()
+                self.assertEqual(imported.pk, product.pk)
+                self.assertEqual(imported.properties, {"ram": 8})
@@ -1,42 +1,279 @@
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db.models import Prefetch
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
 from rest_framework import filters, permissions, generics
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
-from rest_framework.authentication import TokenAuthentication
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Product, Category, ProductDiscount, Review
+from core.views import AsyncGenericAPIView
+from user.authentication import CachedTokenAuthentication
+from .models import Product, Category, ProductDiscount, ProductImage, Review
+from .filters import ProductFilter, ProductSearchFilter
+from .cache import AsyncCachedResponseMixin, CachedResponseMixin
 from .serializers import (
     ProductSerializer,
+    ProductValuesSerializer,
     CategorySerializer,
     ProductDiscountSerializer,
     ReviewSerializer,
 )
 
 
-class CategoryViewSet(ReadOnlyModelViewSet):
-    """Manage category viewing (list, retrieve)"""
+class CategoryMixin:
+    """Basic features for category views"""
 
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
 
-class ProductViewSet(ReadOnlyModelViewSet):
-    """Manage product viewing (list, retrieve)"""
+class CategoryViewSet(CachedResponseMixin, CategoryMixin, ReadOnlyModelViewSet):
+    """Manage category viewing (list, retrieve)"""
+
+    cache_resource = "categories"
+
+
+@extend_schema(exclude=True)
+class AsyncCategoryListView(
+    AsyncCachedResponseMixin, CategoryMixin, AsyncGenericAPIView
+):
+    """Category listing served asynchronously"""
+
+    cache_resource = "categories"
+
+    async def get(self, request):
+        return await self.get_cached_response("list", self.alist, request)
+
+
+@extend_schema(exclude=True)
+class AsyncCategoryDetailView(
+    AsyncCachedResponseMixin, CategoryMixin, AsyncGenericAPIView
+):
+    """Category read served asynchronously"""
+
+    cache_resource = "categories"
+
+    async def get(self, request, pk):
+        return await self.get_cached_response(
+            f"object:{pk}", self.aretrieve, request, pk=pk
+        )
+
+
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        "fields",
+        str,
+        description="Comma separated fields to return, all by default.",
+    ),
+    OpenApiParameter(
+        "omit",
+        str,
+        description="Comma separated fields to leave out of the response.",
+    ),
+]
+
 
-    queryset = Product.objects.all()
+class SparseFieldsetMixin:
+    """
+    Basic features for sparse fieldsets: limit serialized fields
+    with `fields`/`omit` query parameters
+    """
+
+    # Model fields loaded only for the serializer field
+    sparse_field_columns = {}
+
+    def get_sparse_fields(self):
+        """Get requested serializer fields, `None` for all of them"""
+        if hasattr(self, "_sparse_fields"):
+            return self._sparse_fields
+
+        available_fields = self.get_serializer_class().Meta.fields
+        fields = omit = None
+        errors = {}
+        for param in ("fields", "omit"):
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            names = [name.strip() for name in value.split(",") if name.strip()]
+            unknown = [name for name in names if name not in available_fields]
+            if unknown:
+                errors[param] = f"Unknown fields: {', '.join(unknown)}"
+            if param == "fields":
+                fields = names
+            else:
+                omit = names
+        if errors:
+            raise ValidationError(errors)
+
+        if fields is None and omit is None:
+            self._sparse_fields = None
+        else:
+            self._sparse_fields = tuple(
+                name
+                for name in available_fields
+                if (fields is None or name in fields)
+                and (omit is None or name not in omit)
+            )
+        return self._sparse_fields
+
+    def get_deferred_columns(self):
+        """Get model columns needed only by the omitted fields"""
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return []
+
+        model_fields = {field.name for field in self.queryset.model._meta.fields}
+        columns = []
+        for name in self.get_serializer_class().Meta.fields:
+            if name in fields:
+                continue
+            default = [name] if name in model_fields else []
+            columns += self.sparse_field_columns.get(name, default)
+        # Primary key is always loaded
+        return [column for column in columns if column != "id"]
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            kwargs["fields"] = fields
+        return super().get_serializer(*args, **kwargs)
+
+
+class ProductMixin(SparseFieldsetMixin):
+    """Basic features for product views"""
+
+    sparse_field_columns = {
+        "rating_histogram": [f"rating_{star}_count" for star in range(1, 6)],
+    }
+
+    # Calculate final prices in SQL so that a page of products costs
+    # a fixed number of queries regardless of its size
+    queryset = (
+        Product.objects.with_final_price()
+        # The search document is only needed inside the database
+        .defer("search_vector")
+    )
     serializer_class = ProductSerializer
     filter_backends = [
         DjangoFilterBackend,
         filters.OrderingFilter,
-        filters.SearchFilter,
+        ProductSearchFilter,
     ]
-    ordering_fields = ["created_at", "price", "rating"]
-    filterset_fields = ["category"]
-    search_fields = ["name"]
+    ordering_fields = ["created_at", "price", "final_price", "rating"]
+    filterset_class = ProductFilter
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Don't pull columns and relations of omitted fields
+        deferred_columns = self.get_deferred_columns()
+        if deferred_columns:
+            queryset = queryset.defer(*deferred_columns)
+
+        fields = self.get_sparse_fields()
+        if fields is None or "images" in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch("images", queryset=ProductImage.objects.order_by("id"))
+            )
+        return queryset
+
+    def get_values_queryset(self, queryset):
+        """Select plain rows serialized by `ProductValuesSerializer`"""
+        columns = ProductValuesSerializer.get_value_columns(self.get_sparse_fields())
+        # Pagination reads the ordering values of boundary rows
+        for field in queryset.query.order_by or Product._meta.ordering:
+            name = field.lstrip("-")
+            if name not in columns and name != "pk":
+                columns.append(name)
+        return queryset.prefetch_related(None).values(*columns)
 
+    def get_values_serializer(self, rows):
+        return ProductValuesSerializer(
+            rows,
+            many=True,
+            context=self.get_serializer_context(),
+            fields=self.get_sparse_fields(),
+        )
 
-class ProductDiscountViewSet(ReadOnlyModelViewSet):
+
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+)
+class ProductViewSet(CachedResponseMixin, ProductMixin, ReadOnlyModelViewSet):
+    """Manage product viewing (list, retrieve)"""
+
+    cache_resource = "products"
+
+    def list(self, request, *args, **kwargs):
+        if not settings.CATALOG_FAST_SERIALIZER:
+            return super().list(request, *args, **kwargs)
+        return self.get_cached_response(
+            "list", self.list_values, request, *args, **kwargs
+        )
+
+    def list_values(self, request, *args, **kwargs):
+        # Serialize plain rows instead of model instances
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = self.get_values_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_values_serializer(queryset if page is None else page)
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    @action(detail=False)
+    def facets(self, request):
+        """Count products per property value for the current filters"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(queryset.property_facets())
+
+
+@extend_schema(exclude=True)
+class AsyncProductListView(AsyncCachedResponseMixin, ProductMixin, AsyncGenericAPIView):
+    """Product listing served asynchronously"""
+
+    cache_resource = "products"
+
+    async def get(self, request):
+        return await self.get_cached_response("list", self.alist, request)
+
+    async def alist(self, request, *args, **kwargs):
+        if not settings.CATALOG_FAST_SERIALIZER:
+            return await super().alist(request, *args, **kwargs)
+
+        # Serialize plain rows instead of model instances
+        queryset = await self.afilter_queryset(self.get_queryset())
+        queryset = self.get_values_queryset(queryset)
+        page = await self.apaginate_queryset(queryset)
+        if page is None:
+            serializer = self.get_values_serializer([row async for row in queryset])
+            return Response(await serializer.adata())
+        serializer = self.get_values_serializer(page)
+        return self.get_paginated_response(await serializer.adata())
+
+
+@extend_schema(exclude=True)
+class AsyncProductDetailView(
+    AsyncCachedResponseMixin, ProductMixin, AsyncGenericAPIView
+):
+    """Product read served asynchronously"""
+
+    cache_resource = "products"
+
+    async def get(self, request, pk):
+        return await self.get_cached_response(
+            f"object:{pk}", self.aretrieve, request, pk=pk
+        )
+
+
+class ProductDiscountViewSet(CachedResponseMixin, ReadOnlyModelViewSet):
     """Manage product discount viewing (list, retrieve)"""
 
+    cache_resource = "discounts"
     queryset = ProductDiscount.objects.all()
     serializer_class = ProductDiscountSerializer
     filter_backends = [filters.OrderingFilter]
@@ -46,7 +283,7 @@ class ProductDiscountViewSet(ReadOnlyModelViewSet):
 class ReviewMixin:
     """Basic features for review views"""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
 
@@ -57,13 +294,17 @@ class ReviewMixin:
         return super().get_permissions()
 
 
-class ReviewListView(ReviewMixin, generics.ListCreateAPIView):
-    """Review listing and creation"""
+class ReviewListMixin(ReviewMixin):
+    """Basic features for review listing of the contextual product"""
 
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ["created_at", "updated_at", "rating"]
     ordering = ["-updated_at"]
 
+
+class ReviewListView(ReviewListMixin, generics.ListCreateAPIView):
+    """Review listing and creation"""
+
     def get_queryset(self):
         product_id = self.kwargs.get("product_pk")
         product = get_object_or_404(Product, pk=product_id)
@@ -77,6 +318,19 @@ class ReviewListView(ReviewMixin, generics.ListCreateAPIView):
         return serializer.save(user=self.request.user, product=product)
 
 
+@extend_schema(exclude=True)
+class AsyncReviewListView(ReviewListMixin, AsyncGenericAPIView):
+    """Review listing served asynchronously"""
+
+    async def get(self, request, product_pk):
+        await aget_object_or_404(Product.objects.only("id"), pk=product_pk)
+        return await self.alist(request)
+
+    def get_queryset(self):
+        # Limit reviews to contextual product
+        return self.queryset.filter(product_id=self.kwargs["product_pk"])
+
+
 class ReviewDetailView(ReviewMixin, generics.RetrieveUpdateDestroyAPIView):
     """Review detail read, update and delete operations"""
 
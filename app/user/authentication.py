@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from core.metrics import record_cache_access
+
+
+class LocalCache:
+    """Thread-safe in-process LRU cache with expiring entries"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+local_tokens = LocalCache(settings.AUTH_TOKEN_LOCAL_CACHE_SIZE)
+
+# User fields kept in the token caches: those checked by permissions and
+# the email of payment descriptions. Credentials are never cached, other
+# fields of the authenticated user are loaded on first access
+CACHED_USER_FIELDS = ("id", "email", "is_active", "is_staff", "is_superuser")
+
+
+def _token_cache_key(key):
+    # Don't keep raw tokens in the shared cache
+    return f"auth:token:v2:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def is_token_expired(token):
+    if settings.AUTH_TOKEN_TTL is None:
+        return False
+    return token.created < timezone.now() - timedelta(seconds=settings.AUTH_TOKEN_TTL)
+
+
+def invalidate_token(key):
+    """Drop the cached token once the current transaction commits"""
+
+    def invalidate():
+        cache_key = _token_cache_key(key)
+        local_tokens.delete(cache_key)
+        cache.delete(cache_key)
+
+    transaction.on_commit(invalidate)
+
+
+def get_or_create_token(user):
+    """Get the user's token, replace it with a new one if it is expired"""
+    token, created = Token.objects.get_or_create(user=user)
+    if not created and is_token_expired(token):
+        token.delete()
+        token = Token.objects.create(user=user)
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication caching tokens with a few fields of their users
+    in process memory and in the shared cache, so most requests don't
+    query the database. Tokens are invalidated in the shared cache when
+    they or their users change. Process memory keeps them only for
+    `AUTH_TOKEN_LOCAL_CACHE_TIMEOUT` seconds to bound staleness.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _token_cache_key(key)
+        data = local_tokens.get(cache_key)
+        record_cache_access("auth_token:local", data is not None)
+        if data is None:
+            data = cache.get(cache_key)
+            record_cache_access("auth_token:shared", data is not None)
+            if data is None:
+                data = self.get_token_data(key)
+                cache.set(cache_key, data, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            local_tokens.set(cache_key, data, settings.AUTH_TOKEN_LOCAL_CACHE_TIMEOUT)
+
+        # Every request gets its own instances to modify
+        token = self.build_token(key, data)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        if is_token_expired(token):
+            token.delete()
+            raise exceptions.AuthenticationFailed("Token has expired.")
+        return (token.user, token)
+
+    def get_token_data(self, key):
+        """Get the token creation time and the cached fields of its user"""
+        user_fields = self.get_cached_user_fields()
+        data = (
+            self.get_model()
+            .objects.filter(key=key)
+            .values("created", *(f"user__{name}" for name in user_fields))
+            .first()
+        )
+        if data is None:
+            raise exceptions.AuthenticationFailed("Invalid token.")
+        return {
+            "created": data["created"],
+            "user": [data[f"user__{name}"] for name in user_fields],
+        }
+
+    def build_token(self, key, data):
+        """Build the token with its user having only the cached fields loaded"""
+        user = get_user_model().from_db(
+            DEFAULT_DB_ALIAS, self.get_cached_user_fields(), data["user"]
+        )
+        return self.get_model()(key=key, user=user, created=data["created"])
+
+    @staticmethod
+    def get_cached_user_fields():
+        # In the order of model fields, `from_db()` relies on it.
+        # `is_active` is a plain attribute unless the user model defines it
+        return [
+            field.attname
+            for field in get_user_model()._meta.concrete_fields
+            if field.attname in CACHED_USER_FIELDS
+        ]
@@ -0,0 +1,352 @@
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+import redis
+from django.conf import settings
+from django.db import connection, transaction
+from product.models import Product
+from .models import Cart, CartItem
+
+
+class CartStore(ABC):
+    """
+    Storage of users' cart items behind the cart views.
+    Items are returned as `CartItem` instances, listed ones carry
+    `final_price` and `total_cost` of the line.
+    """
+
+    @abstractmethod
+    def get_items(self, user_id):
+        """Get cart items of the user ordered by id"""
+
+    @abstractmethod
+    def get_item(self, user_id, item_id):
+        """Get the user's cart item, `None` if it does not exist"""
+
+    @abstractmethod
+    def has_items(self, user_id):
+        """Check if the user's cart has any items"""
+
+    @abstractmethod
+    def get_quantities(self, user_id):
+        """Get quantities of the cart items by product id"""
+
+    @abstractmethod
+    def has_product(self, user_id, product_id):
+        """Check if the product is in the user's cart"""
+
+    @abstractmethod
+    def add_item(self, user_id, product, quantity):
+        """Add the product to the cart, return the new item"""
+
+    @abstractmethod
+    def update_item(self, user_id, item, quantity):
+        """Set the quantity of the cart item, return the item"""
+
+    @abstractmethod
+    def remove_item(self, user_id, item):
+        """Remove the item from the cart"""
+
+    def flush(self, user_id, evict=False):
+        """Write pending changes of the cart to the database"""
+
+    def clear(self, user_id):
+        """Forget the cart emptied in the database, e.g. by checkout"""
+
+    def flush_idle(self):
+        """Flush carts without recent writes, return their number"""
+        return 0
+
+    def get_cart(self, user_id):
+        """Get the cart with its items as `lines` and the `total_amount`"""
+        cart = Cart(user_id=user_id)
+        cart.lines = list(self.get_items(user_id))
+        cart.total_amount = round(sum(line.total_cost for line in cart.lines), 2)
+        return cart
+
+    @staticmethod
+    def _update_total_cost(item):
+        # Keep the line cost in line with the new quantity
+        if getattr(item, "final_price", None) is not None:
+            item.total_cost = item.final_price * item.quantity
+
+
+class DatabaseCartStore(CartStore):
+    """Keep cart items in the `CartItem` table"""
+
+    def get_items(self, user_id):
+        return (
+            CartItem.objects.filter(cart_id=user_id)
+            .with_total_cost()
+            .select_related("product")
+            .order_by("id")
+        )
+
+    def get_item(self, user_id, item_id):
+        return self.get_items(user_id).filter(pk=item_id).first()
+
+    def has_items(self, user_id):
+        return CartItem.objects.filter(cart_id=user_id).exists()
+
+    def get_quantities(self, user_id):
+        return dict(
+            CartItem.objects.filter(cart_id=user_id).values_list(
+                "product_id", "quantity"
+            )
+        )
+
+    def has_product(self, user_id, product_id):
+        return CartItem.objects.filter(cart_id=user_id, product_id=product_id).exists()
+
+    def add_item(self, user_id, product, quantity):
+        return CartItem.objects.create(
+            cart_id=user_id, product=product, quantity=quantity
+        )
+
+    def update_item(self, user_id, item, quantity):
+        item.quantity = quantity
+        item.save()
+        self._update_total_cost(item)
+        return item
+
+    def remove_item(self, user_id, item):
+        item.delete()
+
+
+@lru_cache
+def get_redis_client(url):
+    return redis.Redis.from_url(url, decode_responses=True)
+
+
+class RedisCartStore(CartStore):
+    """
+    Keep active carts in Redis hashes and write them behind to the
+    `CartItem` table at checkout or once they are idle.
+
+    A cart is a hash of `item id -> "product id:quantity"` loaded from
+    the database on first access and kept for `CART_TTL` seconds since
+    the last access. Item ids are taken from the `CartItem` primary key
+    sequence, so they stay the same once flushed.
+    """
+
+    # Hash field marking a cart loaded from the database
+    LOADED_FIELD = "loaded"
+    # Sorted set of carts with unflushed writes scored by the last write time
+    DIRTY_KEY = "cart:dirty"
+
+    def __init__(self):
+        self.redis = get_redis_client(settings.CART_REDIS_URL)
+
+    def get_items(self, user_id):
+        return self._build_items(user_id, self._load(user_id))
+
+    def get_item(self, user_id, item_id):
+        value = self._load(user_id).get(str(item_id))
+        if value is None:
+            return None
+        items = self._build_items(user_id, {str(item_id): value})
+        return items[0] if items else None
+
+    def has_items(self, user_id):
+        return len(self._load(user_id)) > 1
+
+    def get_quantities(self, user_id):
+        items = self._parse(self._load(user_id))
+        # Keep the latest item of a product added twice, as on saving
+        return {
+            product_id: quantity
+            for _, (product_id, quantity) in sorted(items.items())
+        }
+
+    def has_product(self, user_id, product_id):
+        return any(
+            product == product_id
+            for product, _ in self._parse(self._load(user_id)).values()
+        )
+
+    def add_item(self, user_id, product, quantity):
+        self._load(user_id)
+        item = CartItem(
+            id=self._next_item_id(),
+            cart_id=user_id,
+            product=product,
+            quantity=quantity,
+        )
+        # Same stock validation as on saving to the database
+        item.clean()
+        self._write(user_id, {item.pk: f"{product.pk}:{quantity}"})
+        return item
+
+    def update_item(self, user_id, item, quantity):
+        item.quantity = quantity
+        item.clean()
+        self._write(user_id, {item.pk: f"{item.product_id}:{quantity}"})
+        self._update_total_cost(item)
+        return item
+
+    def remove_item(self, user_id, item):
+        self._write(user_id, removed=[item.pk])
+
+    def flush(self, user_id, evict=False):
+        """
+        Write the cart to the database. The write is retried if the cart
+        changes meanwhile, so the database never keeps an older state.
+        """
+        key = self._key(user_id)
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    data = pipe.hgetall(key)
+                    # The user may be deleted with the cart meanwhile
+                    is_saved = data and Cart.objects.filter(pk=user_id).exists()
+                    if is_saved:
+                        self._save(user_id, self._parse(data))
+                    pipe.multi()
+                    pipe.zrem(self.DIRTY_KEY, user_id)
+                    if evict or not is_saved:
+                        pipe.delete(key)
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
+
+    def clear(self, user_id):
+        with self.redis.pipeline() as pipe:
+            pipe.delete(self._key(user_id))
+            pipe.zrem(self.DIRTY_KEY, user_id)
+            pipe.execute()
+
+    def flush_idle(self):
+        idle_since = time.time() - settings.CART_IDLE_FLUSH_TIMEOUT
+        user_ids = self.redis.zrangebyscore(self.DIRTY_KEY, "-inf", idle_since)
+        for user_id in user_ids:
+            # Free memory of idle carts, they are loaded again on access
+            self.flush(int(user_id), evict=True)
+        return len(user_ids)
+
+    def _key(self, user_id):
+        return f"cart:{user_id}"
+
+    def _load(self, user_id):
+        """Get the cart hash, load it from the database if missing"""
+        key = self._key(user_id)
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(key)
+            # Keep carts in use, idle ones expire and are loaded again
+            pipe.expire(key, settings.CART_TTL)
+            data, _ = pipe.execute()
+        if data:
+            return data
+
+        data = {self.LOADED_FIELD: "1"}
+        items = CartItem.objects.filter(cart_id=user_id).values_list(
+            "id", "product_id", "quantity"
+        )
+        for item_id, product_id, quantity in items:
+            data[str(item_id)] = f"{product_id}:{quantity}"
+
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                # Don't overwrite the cart loaded and changed meanwhile
+                if not pipe.exists(key):
+                    pipe.multi()
+                    pipe.hset(key, mapping=data)
+                    pipe.expire(key, settings.CART_TTL)
+                    pipe.execute()
+                    return data
+            except redis.WatchError:
+                pass
+        return self.redis.hgetall(key)
+
+    def _write(self, user_id, changed=None, removed=None):
+        with self.redis.pipeline() as pipe:
+            if changed:
+                pipe.hset(self._key(user_id), mapping=changed)
+            if removed:
+                pipe.hdel(self._key(user_id), *removed)
+            pipe.expire(self._key(user_id), settings.CART_TTL)
+            pipe.zadd(self.DIRTY_KEY, {user_id: time.time()})
+            pipe.execute()
+
+    def _parse(self, data):
+        """Get `{item id: (product id, quantity)}` of the cart hash"""
+        items = {}
+        for item_id, value in data.items():
+            if item_id == self.LOADED_FIELD:
+                continue
+            product_id, quantity = value.split(":")
+            items[int(item_id)] = (int(product_id), int(quantity))
+        return items
+
+    def _build_items(self, user_id, data):
+        """Build cart items with their products and costs"""
+        items = self._parse(data)
+        products = Product.objects.with_final_price().in_bulk(
+            {product_id for product_id, _ in items.values()}
+        )
+        cart_items = []
+        for item_id, (product_id, quantity) in sorted(items.items()):
+            # Skip products deleted meanwhile
+            product = products.get(product_id)
+            if product is None:
+                continue
+            item = CartItem(
+                id=item_id, cart_id=user_id, product=product, quantity=quantity
+            )
+            item.final_price = product.final_price
+            item.total_cost = product.final_price * quantity
+            cart_items.append(item)
+        return cart_items
+
+    def _next_item_id(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id'))",
+                [CartItem._meta.db_table],
+            )
+            return cursor.fetchone()[0]
+
+    @transaction.atomic
+    def _save(self, user_id, items):
+        existing_products = set(
+            Product.objects.filter(
+                pk__in={product_id for product_id, _ in items.values()}
+            ).values_list("pk", flat=True)
+        )
+        # Keep the latest item of a product added twice concurrently
+        latest_items = {}
+        for item_id, (product_id, quantity) in sorted(items.items()):
+            if product_id in existing_products:
+                latest_items[product_id] = (item_id, quantity)
+
+        CartItem.objects.filter(cart_id=user_id).exclude(
+            pk__in=[item_id for item_id, _ in latest_items.values()]
+        ).delete()
+        # Validation is skipped, stock is checked again at checkout
+        CartItem.objects.bulk_create(
+            [
+                CartItem(
+                    id=item_id,
+                    cart_id=user_id,
+                    product_id=product_id,
+                    quantity=quantity,
+                )
+                for product_id, (item_id, quantity) in latest_items.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=["quantity", "updated_at"],
+        )
+
+
+CART_STORES = {
+    "database": DatabaseCartStore,
+    "redis": RedisCartStore,
+}
+
+
+def get_cart_store():
+    """Get the cart store configured by `CART_STORE` setting"""
+    return CART_STORES[settings.CART_STORE]()
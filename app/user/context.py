@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from order.models import Order
+from .carts import get_cart_store
+
+
+class UserContext:
+    """
+    Data of the request user loaded once per request and shared by
+    permissions, views and serializers. Profile and shipping address
+    are loaded together and cached on `request.user`, so reading
+    `user.profile` or `user.shipping_address` doesn't query again.
+    """
+
+    # Reverse one-to-one relations of the user loaded together
+    related_names = ("profile", "shipping_address")
+
+    def __init__(self, user):
+        self.user = user
+        self.is_related_loaded = False
+        self.orders = {}
+        self._cart_quantities = None
+
+    def load_related(self):
+        """Load the user's profile and shipping address in one query"""
+        if self.is_related_loaded:
+            return
+        user_model = get_user_model()
+        loaded_user = user_model.objects.select_related(*self.related_names).get(
+            pk=self.user.pk
+        )
+        for name in self.related_names:
+            related = getattr(user_model, name).related
+            # Missing objects are cached as `None` and raise on access
+            value = getattr(loaded_user, name, None)
+            related.set_cached_value(self.user, value)
+            if value is not None:
+                related.field.set_cached_value(value, self.user)
+        self.is_related_loaded = True
+
+    @property
+    def profile(self):
+        """Get the user's profile, `None` if it does not exist"""
+        self.load_related()
+        return getattr(self.user, "profile", None)
+
+    @property
+    def shipping_address(self):
+        """Get the user's shipping address, `None` if it does not exist"""
+        self.load_related()
+        return getattr(self.user, "shipping_address", None)
+
+    @property
+    def cart_quantities(self):
+        """Get quantities of the cart items by product id"""
+        if self._cart_quantities is None:
+            self._cart_quantities = get_cart_store().get_quantities(self.user.pk)
+        return self._cart_quantities
+
+    @property
+    def has_cart_items(self):
+        return bool(self.cart_quantities)
+
+    def get_order(self, order_id):
+        """Get the user's order, raise `Http404` if the user has no such order"""
+        if order_id not in self.orders:
+            order = get_object_or_404(self.get_orders(), pk=order_id)
+            self.add_order(order)
+        return self.orders[order_id]
+
+    async def aget_order(self, order_id):
+        """Async counterpart of `get_order`"""
+        if order_id not in self.orders:
+            order = await aget_object_or_404(self.get_orders(), pk=order_id)
+            self.add_order(order)
+        return self.orders[order_id]
+
+    def get_orders(self):
+        return Order.objects.filter(user=self.user)
+
+    def add_order(self, order):
+        # The order's user is the request user, don't load it again
+        order.user = self.user
+        self.orders[order.pk] = order
+
+
+def get_user_context(request):
+    """Get the context of the request user, created on first use"""
+    context = getattr(request, "user_context", None)
+    if context is None:
+        context = UserContext(request.user)
+        request.user_context = context
+    return context
@@ -1,6 +1,7 @@
 import os
 from uuid import uuid4
 from django.db import models
+from django.db.models import F, Sum
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
@@ -69,6 +70,10 @@ class Profile(models.Model):
     profile_photo = models.ImageField(
         upload_to=generate_user_image_path, blank=True, null=True
     )
+    # Metadata of resized photo variants created in background
+    profile_photo_variants = models.JSONField(
+        default=dict, blank=True, editable=False
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -130,8 +135,32 @@ class Cart(models.Model):
 
     def get_total_amount(self):
         """Get total amount for all cart items"""
-        total_amount = sum(item.get_total_cost() for item in self.cart_items.all())
-        return round(total_amount, 2)
+        return self.cart_items.total_amount()
+
+
+class CartItemQuerySet(models.QuerySet):
+    """Cart item queryset"""
+
+    def with_total_cost(self):
+        """
+        Annotate cart items with the product price after discount
+        as `final_price` and the line cost as `total_cost`
+        """
+        # Product models depend on the user model, import them lazily
+        from product.models import final_price_expression
+
+        final_price = final_price_expression("product__")
+        return self.annotate(
+            final_price=final_price,
+            total_cost=final_price * F("quantity"),
+        )
+
+    def total_amount(self):
+        """Get total cost of the cart items in one aggregate query"""
+        total_amount = self.with_total_cost().aggregate(
+            total_amount=Sum("total_cost")
+        )["total_amount"]
+        return round(total_amount or 0, 2)
 
 
 class CartItem(models.Model):
@@ -146,6 +175,8 @@ class CartItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartItemQuerySet.as_manager()
+
     def get_total_cost(self):
         """
         Get the total cost of the cart item taking into account
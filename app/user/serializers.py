@@ -3,7 +3,9 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.authentication import authenticate
 from .models import ShippingAddress, Profile, WishItem, Cart, CartItem
+from .carts import get_cart_store
 from product.models import Product
+from core.images import get_image_variant_urls
 
 
 class AuthTokenSeralizer(serializers.Serializer):
@@ -49,6 +51,9 @@ class ShippingAddressSerializer(serializers.ModelSerializer):
 class ProfileSerializer(serializers.ModelSerializer):
     """Customer profile serializer"""
 
+    # Resized photo variants by size and format
+    profile_photo_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Profile
         fields = (
@@ -57,9 +62,17 @@ class ProfileSerializer(serializers.ModelSerializer):
             "last_name",
             "telephone",
             "profile_photo",
+            "profile_photo_variants",
         )
         read_only_fields = ("user",)
 
+    def get_profile_photo_variants(self, obj):
+        return get_image_variant_urls(
+            obj.profile_photo_variants,
+            obj.profile_photo.storage,
+            self.context.get("request"),
+        )
+
 
 class UserRegisterSerializer(serializers.ModelSerializer):
     """User credentials serializer for register"""
@@ -106,17 +119,43 @@ class WishItemSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class CartProductSerializer(serializers.ModelSerializer):
+    """Product summary serializer for cart lines"""
+
+    class Meta:
+        model = Product
+        fields = ("id", "name", "brand", "price", "qty_in_stock")
+
+
+class CartLineSerializer(serializers.ModelSerializer):
+    """Cart item serializer embedded into cart"""
+
+    product = CartProductSerializer()
+    # Annotated by `CartItemQuerySet.with_total_cost()`
+    final_price = serializers.DecimalField(max_digits=8, decimal_places=2)
+    total_cost = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+    class Meta:
+        model = CartItem
+        fields = ("id", "product", "quantity", "final_price", "total_cost")
+
+
 class CartSerializer(serializers.ModelSerializer):
     """Cart serializer for reading"""
 
     total_amount = serializers.SerializerMethodField()
+    # Set by `CartStore.get_cart()`
+    items = CartLineSerializer(source="lines", many=True)
 
     class Meta:
         model = Cart
-        fields = ("user", "total_amount")
+        fields = ("user", "total_amount", "items")
 
     def get_total_amount(self, obj):
-        return obj.get_total_amount()
+        total_amount = getattr(obj, "total_amount", None)
+        if total_amount is None:
+            return obj.get_total_amount()
+        return total_amount
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -129,8 +168,13 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ("id", "cart", "product", "quantity", "total_cost")
         read_only_fields = ("id", "cart")
 
+    # Get line cost annotated by `with_total_cost()`
+    # or fall back to object's method
     def get_total_cost(self, obj):
-        return obj.get_total_cost()
+        total_cost = getattr(obj, "total_cost", None)
+        if total_cost is None:
+            return obj.get_total_cost()
+        return round(total_cost, 2)
 
     def validate(self, attrs):
         # Validation for create operation
@@ -145,10 +189,10 @@ class CartItemSerializer(serializers.ModelSerializer):
 
     def _validate_unique_cart_product(self, attrs):
         """Ensure the product is not already in the user's cart"""
-        cart = self.context["request"].user.cart
+        user = self.context["request"].user
         product = attrs.get("product")
         # Error if the user tries to add the same product to cart again
-        if CartItem.objects.filter(cart=cart, product=product):
+        if get_cart_store().has_product(user.pk, product.pk):
             error = "You have already added this item to your cart!"
             raise ValidationError({"detail": error})
 
@@ -1,7 +1,12 @@
+from django.db import transaction
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save, post_delete
-from .models import Cart, CartItem
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_token
+from .models import Cart, CartItem, Profile
+from core.images import has_stale_variants
+from core.tasks import create_image_variants
 
 
 @receiver(post_save, sender=get_user_model())
@@ -9,3 +14,32 @@ def create_cart_for_user(sender, instance, created, **kwargs):
     """Create a cart for the new user"""
     if created:
         Cart.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Profile)
+def create_profile_photo_variants(sender, instance, **kwargs):
+    """Create resized variants of the uploaded profile photo in background"""
+    if has_stale_variants(instance, "profile_photo"):
+        transaction.on_commit(
+            lambda: create_image_variants.delay(
+                "user.Profile", instance.pk, "profile_photo"
+            )
+        )
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Stop authenticating with the deleted token"""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """
+    Drop cached tokens of the changed user, e.g. deactivated
+    or with new credentials. Deleted users' tokens are deleted with them.
+    """
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list("key", flat=True):
+        invalidate_token(key)
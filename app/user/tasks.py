@@ -0,0 +1,22 @@
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from .carts import get_cart_store
+
+
+@shared_task
+def flush_idle_carts():
+    """Write carts without recent changes behind to the database"""
+    return get_cart_store().flush_idle()
+
+
+@shared_task
+def delete_expired_tokens():
+    """Keep the token table small by deleting expired tokens"""
+    if settings.AUTH_TOKEN_TTL is None:
+        return 0
+    expired_before = timezone.now() - timedelta(seconds=settings.AUTH_TOKEN_TTL)
+    deleted, _ = Token.objects.filter(created__lt=expired_before).delete()
+    return deleted
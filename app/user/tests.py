@@ -0,0 +1,174 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from product.models import Category, Product
+from .authentication import (
+    CachedTokenAuthentication,
+    _token_cache_key,
+    local_tokens,
+)
+from .carts import RedisCartStore
+from .models import CartItem
+
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+LOCAL_CACHE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "user-tests",
+    }
+}
+
+
+@override_settings(CACHES=LOCAL_CACHE, AUTH_TOKEN_TTL=None)
+class CachedTokenAuthenticationTests(TestCase):
+    """Cached tokens authenticate until they or their users change"""
+
+    def setUp(self):
+        cache.clear()
+        local_tokens.entries.clear()
+        self.user = get_user_model().objects.create_user(
+            email="buyer@example.com", password="password"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.cache_key = _token_cache_key(self.token.key)
+
+    def get_me(self):
+        return APIClient().get(
+            reverse("user:user-details"),
+            HTTP_AUTHORIZATION=f"Token {self.token.key}",
+        )
+
+    def assert_not_cached(self):
+        self.assertIsNone(cache.get(self.cache_key))
+        self.assertIsNone(local_tokens.get(self.cache_key))
+
+    def test_token_is_cached(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        self.assertIsNotNone(cache.get(self.cache_key))
+        self.assertIsNotNone(local_tokens.get(self.cache_key))
+        # Raw tokens are not used as cache keys
+        self.assertNotIn(self.token.key, self.cache_key)
+
+    def test_no_credentials_cached(self):
+        self.get_me()
+        fields = CachedTokenAuthentication.get_cached_user_fields()
+        self.assertNotIn("password", fields)
+        for data in (cache.get(self.cache_key), local_tokens.get(self.cache_key)):
+            self.assertEqual(
+                data["user"], [getattr(self.user, name) for name in fields]
+            )
+            self.assertNotIn(self.user.password, str(data))
+            self.assertNotIn(self.token.key, str(data))
+
+    def test_password_change(self):
+        self.get_me()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password("new password")
+            self.user.save()
+        self.assert_not_cached()
+
+    def test_changed_user(self):
+        self.get_me()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.email = "new@example.com"
+            self.user.save()
+        self.assertEqual(self.get_me().data["email"], "new@example.com")
+
+    def test_logout(self):
+        self.get_me()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assert_not_cached()
+        self.assertEqual(self.get_me().status_code, 401)
+
+    @override_settings(AUTH_TOKEN_TTL=60)
+    def test_expired_token(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        # Expiry is checked on every request, cached tokens too
+        Token.objects.filter(pk=self.token.pk).update(
+            created=timezone.now() - timedelta(seconds=61)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            cache.delete(self.cache_key)
+            local_tokens.delete(self.cache_key)
+            response = self.get_me()
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Token.objects.filter(pk=self.token.pk).exists())
+        self.assert_not_cached()
+
+        # Obtaining a token replaces the expired one
+        response = APIClient().post(
+            reverse("user:token"),
+            {"email": "buyer@example.com", "password": "password"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data["token"], self.token.key)
+
+
+@override_settings(
+    CACHES=NO_CACHE, CART_REDIS_URL=f"{settings.REDIS_URL}/15", CART_TTL=60
+)
+class RedisCartStoreTests(TestCase):
+    """Redis carts are written behind and expire once not used"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email="buyer@example.com", password="password"
+        )
+        category = Category.objects.create(name="Phones")
+        cls.products = [
+            Product.objects.create(
+                category=category,
+                name=f"Phone {number}",
+                qty_in_stock=10,
+                price=Decimal("100.00"),
+            )
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        self.store = RedisCartStore()
+        self.key = self.store._key(self.user.pk)
+        self.store.clear(self.user.pk)
+        self.addCleanup(self.store.clear, self.user.pk)
+
+    def test_loaded_cart_expires(self):
+        CartItem.objects.create(cart_id=self.user.pk, product=self.products[0])
+        quantities = self.store.get_quantities(self.user.pk)
+        self.assertEqual(quantities, {self.products[0].pk: 1})
+        self.assertGreater(self.store.redis.ttl(self.key), 0)
+
+    def test_access_refreshes_expiry(self):
+        self.store.get_items(self.user.pk)
+        self.store.redis.expire(self.key, 5)
+        self.store.has_items(self.user.pk)
+        self.assertGreater(self.store.redis.ttl(self.key), 5)
+
+        self.store.redis.expire(self.key, 5)
+        self.store.add_item(self.user.pk, self.products[0], 2)
+        self.assertGreater(self.store.redis.ttl(self.key), 5)
+
+    def test_expired_cart_is_loaded_again(self):
+        self.assertFalse(self.store.has_items(self.user.pk))
+        # Cart changed in the database meanwhile, e.g. in the admin
+        CartItem.objects.create(cart_id=self.user.pk, product=self.products[1])
+        self.store.redis.delete(self.key)
+        quantities = self.store.get_quantities(self.user.pk)
+        self.assertEqual(quantities, {self.products[1].pk: 1})
+
+    def test_flush(self):
+        item = self.store.add_item(self.user.pk, self.products[0], 2)
+        self.assertFalse(CartItem.objects.exists())
+        self.store.flush(self.user.pk)
+        self.assertEqual(
+            list(CartItem.objects.values_list("id", "product_id", "quantity")),
+            [(item.pk, self.products[0].pk, 2)],
+        )
@@ -1,9 +1,9 @@
+from django.contrib.auth import get_user_model
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.generics import CreateAPIView
 from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.authentication import TokenAuthentication
 from .serializers import (
     UserSerializer,
     UserRegisterSerializer,
@@ -15,7 +15,10 @@ from .serializers import (
     CartItemSerializer,
     CartItemUpdateSerializer,
 )
-from .models import Profile, ShippingAddress, WishItem, CartItem
+from .authentication import CachedTokenAuthentication, get_or_create_token
+from .models import WishItem, CartItem
+from .carts import get_cart_store
+from .context import get_user_context
 
 
 class RegisterUserView(CreateAPIView):
@@ -29,6 +32,13 @@ class ObtainTokenView(ObtainAuthToken):
 
     serializer_class = AuthTokenSeralizer
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Issue a new token instead of the expired one
+        token = get_or_create_token(serializer.validated_data["user"])
+        return Response({"token": token.key})
+
 
 class UserReadDeleteView(
     generics.RetrieveAPIView,
@@ -37,11 +47,15 @@ class UserReadDeleteView(
     """Manage retrieving full user data and deleting him"""
 
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     serializer_class = UserSerializer
 
     def get_object(self):
-        return self.request.user
+        # Load profile and address for the serializer in one query
+        context = get_user_context(self.request)
+        if self.request.method == "GET":
+            context.load_related()
+        return context.user
 
 
 class CredentialsReadUpdateView(
@@ -51,11 +65,14 @@ class CredentialsReadUpdateView(
     """Manage Read and Update operations on user's credentials"""
 
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     serializer_class = UserRegisterSerializer
 
     def get_object(self):
-        return self.request.user
+        if self.request.method == "GET":
+            return self.request.user
+        # The authenticated user has only a few fields loaded, save the full one
+        return get_user_model().objects.get(pk=self.request.user.pk)
 
 
 class AddressCRUDView(
@@ -67,15 +84,15 @@ class AddressCRUDView(
     """Manage CRUD operations on user's shipping address"""
 
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     serializer_class = ShippingAddressSerializer
 
     def get_object(self):
         # Make accessing a non-existent object produce an error
-        try:
-            return self.request.user.shipping_address
-        except ShippingAddress.DoesNotExist:
+        shipping_address = get_user_context(self.request).shipping_address
+        if shipping_address is None:
             raise NotFound({"detail": "Not found."})
+        return shipping_address
 
     def perform_create(self, serializer):
         # Set user field to this user by default
@@ -83,7 +100,7 @@ class AddressCRUDView(
 
     def create(self, request, *args, **kwargs):
         # Report that user can have only one shipping address
-        if getattr(request.user, "shipping_address", None):
+        if get_user_context(request).shipping_address:
             return Response(
                 {"detail": "User can have only 1 shipping address!"},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -100,15 +117,15 @@ class ProfileCRUDView(
     """Manage CRUD operations on user's profile"""
 
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     serializer_class = ProfileSerializer
 
     def get_object(self):
         # Make accessing a non-existent object produce an error
-        try:
-            return self.request.user.profile
-        except Profile.DoesNotExist:
+        profile = get_user_context(self.request).profile
+        if profile is None:
             raise NotFound({"detail": "Not found."})
+        return profile
 
     def perform_create(self, serializer):
         # Set user field to this user by default
@@ -116,7 +133,7 @@ class ProfileCRUDView(
 
     def create(self, request, *args, **kwargs):
         # Report that user can have only one profile
-        if getattr(request.user, "profile", None):
+        if get_user_context(request).profile:
             return Response(
                 {"detail": "This user already has a profile!"},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -128,7 +145,7 @@ class WhishItemMixin:
     """Basic features for whish item views"""
 
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     queryset = WishItem.objects.all()
     serializer_class = WishItemSerializer
 
@@ -155,24 +172,32 @@ class CartDetailView(generics.RetrieveAPIView):
     """Manage user's cart retrieving"""
 
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     serializer_class = CartSerializer
 
     def get_object(self):
-        return self.request.user.cart
+        # Lines with product summaries and costs from the cart store
+        return get_cart_store().get_cart(self.request.user.pk)
 
 
 class CartItemViewSet(viewsets.ModelViewSet):
     """Manage CRUD operations on cart items"""
 
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     queryset = CartItem.objects.all()
     serializer_class = CartItemSerializer
+    lookup_value_regex = r"\d+"
 
     def get_queryset(self):
         # Limit cart items to this user's cart
-        return self.queryset.filter(cart=self.request.user.cart)
+        return get_cart_store().get_items(self.request.user.pk)
+
+    def get_object(self):
+        item = get_cart_store().get_item(self.request.user.pk, self.kwargs["pk"])
+        if item is None:
+            raise NotFound("No CartItem matches the given query.")
+        return item
 
     def get_serializer_class(self):
         # Use serializer with uneditable `product` field when update action
@@ -182,4 +207,19 @@ class CartItemViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         # Assign cart items to this user's cart
-        return serializer.save(cart=self.request.user.cart)
+        serializer.instance = get_cart_store().add_item(
+            self.request.user.pk,
+            serializer.validated_data["product"],
+            serializer.validated_data.get("quantity", 1),
+        )
+
+    def perform_update(self, serializer):
+        item = serializer.instance
+        serializer.instance = get_cart_store().update_item(
+            self.request.user.pk,
+            item,
+            serializer.validated_data.get("quantity", item.quantity),
+        )
+
+    def perform_destroy(self, instance):
+        get_cart_store().remove_item(self.request.user.pk, instance)